@@ -1,592 +1,933 @@
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.exc import OperationalError, IntegrityError
-from sqlalchemy import text, func
-from datetime import datetime, timedelta, time
-import sys
-import os
-import logging
-import functools
-from contextlib import contextmanager
-
-# Добавляем корневую директорию проекта в путь для импорта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import FREE_REQUESTS_LIMIT, IS_POSTGRESQL
-from database.models import User, UserSubscription, FoodAnalysis, init_db
-from monitoring.decorators import track_api_call
-
-logger = logging.getLogger(__name__)
-
-# Инициализация базы данных и сессий
-engine = init_db()
-session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
-
-
-def determine_meal_type(time):
-    """
-    Определяет тип приема пищи по времени
-
-    Args:
-        time (datetime): Время приема пищи
-
-    Returns:
-        str: Тип приема пищи (breakfast, lunch, dinner, snack)
-    """
-    hour = time.hour
-
-    if 5 <= hour < 11:
-        return "breakfast"  # Завтрак: 5:00 - 10:59
-    elif 11 <= hour < 16:
-        return "lunch"  # Обед: 11:00 - 15:59
-    elif 16 <= hour < 21:
-        return "dinner"  # Ужин: 16:00 - 20:59
-    else:
-        return "snack"  # Перекус: 21:00 - 4:59
-
-
-def db_retry(max_retries=3, retry_delay=0.5):
-    """
-    Декоратор для повторных попыток при ошибках БД
-    """
-
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except (OperationalError, IntegrityError) as e:
-                    last_exception = e
-                    error_msg = str(e).lower()
-
-                    # Определяем, стоит ли повторять попытку
-                    if any(keyword in error_msg for keyword in [
-                        'database is locked', 'connection', 'timeout',
-                        'deadlock', 'serialization failure'
-                    ]):
-                        if attempt < max_retries - 1:
-                            wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                            logger.warning(f"Database retry {attempt + 1}/{max_retries} for {func.__name__}: {str(e)}")
-                            import time
-                            time.sleep(wait_time)
-                            continue
-
-                    # Не повторяем для других типов ошибок
-                    logger.error(f"Database error in {func.__name__}: {str(e)}")
-                    raise
-                except Exception as e:
-                    logger.error(f"Unexpected error in {func.__name__}: {str(e)}")
-                    raise
-
-            # Если все попытки исчерпаны
-            logger.error(f"All {max_retries} retries failed for {func.__name__}")
-            raise last_exception
-
-        return wrapper
-
-    return decorator
-
-
-@contextmanager
-def get_db_session():
-    """
-    Context manager для безопасной работы с сессией БД
-    """
-    session = Session()
-    try:
-        yield session
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        logger.error(f"Database session error: {str(e)}")
-        raise
-    finally:
-        session.close()
-
-
-class DatabaseManager:
-    """Класс для управления базой данных с оптимизированными запросами"""
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_user_profile(telegram_id):
-        """
-        Получает профиль пользователя
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                return None
-
-            return {
-                'gender': user.gender,
-                'age': user.age,
-                'weight': user.weight,
-                'height': user.height,
-                'activity_level': user.activity_level,
-                'daily_calories': user.daily_calories,
-                'daily_proteins': user.daily_proteins,
-                'daily_fats': user.daily_fats,
-                'daily_carbs': user.daily_carbs
-            }
-
-    @staticmethod
-    def calculate_daily_norms(gender, age, weight, height, activity_level, goal='maintenance'):
-        """
-        Рассчитывает рекомендуемые дневные нормы КБЖУ по формуле Миффлина-Сан Жеора
-        """
-        # Расчет базового метаболизма (BMR)
-        if gender == 'male':
-            bmr = 10 * weight + 6.25 * height - 5 * age + 5
-        else:  # female
-            bmr = 10 * weight + 6.25 * height - 5 * age - 161
-
-        # Расчет суточной потребности в калориях
-        daily_calories = bmr * activity_level
-
-        # Корректировка в зависимости от цели
-        if goal == 'weight_loss':
-            daily_calories *= 0.8
-        elif goal == 'weight_gain':
-            daily_calories *= 1.15
-
-        # Расчет макронутриентов
-        if goal == 'weight_loss':
-            protein_ratio, fat_ratio, carb_ratio = 0.35, 0.30, 0.35
-        elif goal == 'weight_gain':
-            protein_ratio, fat_ratio, carb_ratio = 0.30, 0.25, 0.45
-        else:  # maintenance
-            protein_ratio, fat_ratio, carb_ratio = 0.30, 0.30, 0.40
-
-        daily_proteins = (daily_calories * protein_ratio) / 4
-        daily_fats = (daily_calories * fat_ratio) / 9
-        daily_carbs = (daily_calories * carb_ratio) / 4
-
-        return {
-            'daily_calories': round(daily_calories, 1),
-            'daily_proteins': round(daily_proteins, 1),
-            'daily_fats': round(daily_fats, 1),
-            'daily_carbs': round(daily_carbs, 1)
-        }
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def update_user_profile(telegram_id, **kwargs):
-        """
-        Обновляет профиль пользователя с автоматическим расчетом норм
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                return None
-
-            # Обновляем переданные поля
-            for field, value in kwargs.items():
-                if hasattr(user, field) and value is not None:
-                    setattr(user, field, value)
-
-            # Автоматический расчет норм, если все параметры указаны
-            if (user.gender and user.age and user.weight and user.height and user.activity_level and
-                    'daily_calories' not in kwargs):
-                goal = user.goal or 'maintenance'
-                norms = DatabaseManager.calculate_daily_norms(
-                    user.gender, user.age, user.weight, user.height, user.activity_level, goal
-                )
-
-                user.daily_calories = norms['daily_calories']
-                user.daily_proteins = norms['daily_proteins']
-                user.daily_fats = norms['daily_fats']
-                user.daily_carbs = norms['daily_carbs']
-
-            # Возвращаем текущие нормы
-            return {
-                'daily_calories': user.daily_calories,
-                'daily_proteins': user.daily_proteins,
-                'daily_fats': user.daily_fats,
-                'daily_carbs': user.daily_carbs
-            }
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_user_daily_norms(telegram_id):
-        """
-        Получает дневные нормы КБЖУ пользователя
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user or not user.daily_calories:
-                return None
-
-            return {
-                'daily_calories': user.daily_calories,
-                'daily_proteins': user.daily_proteins,
-                'daily_fats': user.daily_fats,
-                'daily_carbs': user.daily_carbs,
-                'has_full_profile': bool(
-                    user.gender and user.age and user.weight and
-                    user.height and user.activity_level
-                )
-            }
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_or_create_user(telegram_id, username=None, first_name=None, last_name=None):
-        """
-        Получить или создать пользователя (оптимизированная версия)
-        """
-        with get_db_session() as session:
-            # Сначала пытаемся найти существующего пользователя
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-
-            if not user:
-                # Создаем нового пользователя
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name
-                )
-                session.add(user)
-                session.flush()  # Получаем ID без commit
-                logger.info(f"Created new user: {telegram_id}")
-
-            return user
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_nutrition_stats_for_date(telegram_id, date):
-        """
-        Оптимизированное получение статистики за дату
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                return None
-
-            # Определяем границы дня
-            start_of_day = datetime.combine(date, time.min)
-            end_of_day = datetime.combine(date, time.max)
-
-            # Один оптимизированный запрос вместо множественных
-            analyses = session.query(FoodAnalysis).filter(
-                FoodAnalysis.user_id == user.id,
-                FoodAnalysis.analysis_date >= start_of_day,
-                FoodAnalysis.analysis_date <= end_of_day
-            ).order_by(FoodAnalysis.analysis_date).all()
-
-            # Инициализация статистики
-            meal_stats = {
-                meal_type: {"count": 0, "calories": 0, "proteins": 0, "fats": 0, "carbs": 0, "items": []}
-                for meal_type in ["breakfast", "lunch", "dinner", "snack"]
-            }
-            meal_stats["total"] = {"count": 0, "calories": 0, "proteins": 0, "fats": 0, "carbs": 0, "items": []}
-
-            # Обработка результатов
-            for analysis in analyses:
-                meal_type = analysis.meal_type or "snack"
-
-                # Обновляем статистику по типу приема пищи
-                meal_stats[meal_type]["count"] += 1
-                meal_stats[meal_type]["calories"] += analysis.calories or 0
-                meal_stats[meal_type]["proteins"] += analysis.proteins or 0
-                meal_stats[meal_type]["fats"] += analysis.fats or 0
-                meal_stats[meal_type]["carbs"] += analysis.carbs or 0
-
-                # Добавляем информацию о блюде
-                item_info = {
-                    "name": analysis.food_name,
-                    "calories": analysis.calories,
-                    "proteins": analysis.proteins,
-                    "fats": analysis.fats,
-                    "carbs": analysis.carbs,
-                    "time": analysis.analysis_date.strftime("%H:%M"),
-                    "portion_weight": analysis.portion_weight
-                }
-                meal_stats[meal_type]["items"].append(item_info)
-
-                # Обновляем общую статистику
-                meal_stats["total"]["count"] += 1
-                meal_stats["total"]["calories"] += analysis.calories or 0
-                meal_stats["total"]["proteins"] += analysis.proteins or 0
-                meal_stats["total"]["fats"] += analysis.fats or 0
-                meal_stats["total"]["carbs"] += analysis.carbs or 0
-                meal_stats["total"]["items"].append(item_info)
-
-            # Округляем значения
-            for meal_type in meal_stats:
-                for nutrient in ["calories", "proteins", "fats", "carbs"]:
-                    meal_stats[meal_type][nutrient] = round(meal_stats[meal_type][nutrient], 1)
-
-            return meal_stats
-
-    @staticmethod
-    @track_api_call('db_save_food_analysis')
-    @db_retry(max_retries=3)
-    def save_food_analysis(telegram_id, food_name, calories, proteins, fats, carbs,
-                           image_path=None, portion_weight=None, analysis_time=None):
-        """
-        Оптимизированное сохранение анализа еды
-        """
-        with get_db_session() as session:
-            # Получаем или создаем пользователя в одной транзакции
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                user = User(telegram_id=telegram_id)
-                session.add(user)
-                session.flush()  # Получаем ID пользователя
-
-            # Определяем время и тип приема пищи
-            if analysis_time is None:
-                analysis_time = datetime.utcnow()
-
-            meal_type = determine_meal_type(analysis_time)
-
-            # Создаем анализ
-            food_analysis = FoodAnalysis(
-                user_id=user.id,
-                food_name=food_name,
-                calories=calories,
-                proteins=proteins,
-                fats=fats,
-                carbs=carbs,
-                image_path=image_path,
-                portion_weight=portion_weight,
-                analysis_date=analysis_time,
-                meal_type=meal_type
-            )
-
-            session.add(food_analysis)
-            session.flush()  # Получаем ID анализа
-
-            analysis_id = food_analysis.id
-            logger.info(f"Saved food analysis {analysis_id} for user {telegram_id}")
-
-            return analysis_id
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def check_subscription_status(telegram_id):
-        """
-        ИСПРАВЛЕННАЯ проверка статуса подписки с автоочисткой
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                return False
-
-            # Московское время (UTC+3)
-            now_msk = datetime.utcnow() + timedelta(hours=3)
-
-            # Находим и деактивируем истекшие подписки этого пользователя
-            expired_subscriptions = session.query(UserSubscription).filter(
-                UserSubscription.user_id == user.id,
-                UserSubscription.is_active == True,
-                UserSubscription.end_date <= now_msk
-            ).all()
-
-            # Деактивируем истекшие подписки
-            for subscription in expired_subscriptions:
-                subscription.is_active = False
-                logger.info(f"Деактивирована истекшая подписка для пользователя {telegram_id}")
-
-            # ИСПРАВЛЕНИЕ: Сначала commit изменений
-            if expired_subscriptions:
-                session.commit()
-
-            # Проверяем есть ли активные подписки (ПОСЛЕ commit'а)
-            active_subscription = session.query(UserSubscription).filter(
-                UserSubscription.user_id == user.id,
-                UserSubscription.is_active == True,
-                UserSubscription.end_date > now_msk
-            ).first()
-
-            return bool(active_subscription)
-
-    @staticmethod
-    @track_api_call('db_add_subscription')
-    @db_retry(max_retries=3)
-    def add_subscription(telegram_id, months=1, payment_id=None):
-        """
-        Добавить подписку пользователю
-        """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                user = User(telegram_id=telegram_id)
-                session.add(user)
-                session.flush()
-
-            moscow_time = datetime.utcnow() + timedelta(hours=3)
-            end_date = moscow_time + timedelta(days=30 * months)
-
-            subscription = UserSubscription(
-                user_id=user.id,
-                end_date=end_date,
-                payment_id=payment_id
-            )
-
-            session.add(subscription)
-            session.flush()
-
-            logger.info(f"Added subscription for user {telegram_id}, {months} months")
-            return subscription
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_remaining_free_requests(telegram_id):
-        """
-        Оптимизированное получение оставшихся бесплатных запросов
-        """
-        # Сначала проверяем подписку
-        if DatabaseManager.check_subscription_status(telegram_id):
-            return float('inf')
-
-        with get_db_session() as session:
-            # Подсчитываем использованные запросы одним запросом
-            used_requests = session.query(FoodAnalysis).join(User).filter(
-                User.telegram_id == telegram_id
-            ).count()
-
-            remaining = max(0, FREE_REQUESTS_LIMIT - used_requests)
-            return remaining
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_user_statistics(telegram_id):
-        """
-        Оптимизированная общая статистика пользователя
-        """
-        with get_db_session() as session:
-            # Используем агрегацию на уровне БД вместо Python
-            stats = session.query(
-                func.count(FoodAnalysis.id).label('total_analyses'),
-                func.coalesce(func.sum(FoodAnalysis.calories), 0).label('total_calories'),
-                func.coalesce(func.sum(FoodAnalysis.proteins), 0).label('total_proteins'),
-                func.coalesce(func.sum(FoodAnalysis.fats), 0).label('total_fats'),
-                func.coalesce(func.sum(FoodAnalysis.carbs), 0).label('total_carbs')
-            ).join(User).filter(User.telegram_id == telegram_id).first()
-
-            if not stats:
-                return None
-
-            return {
-                "total_analyses": stats.total_analyses,
-                "total_calories": round(float(stats.total_calories), 1),
-                "total_proteins": round(float(stats.total_proteins), 1),
-                "total_fats": round(float(stats.total_fats), 1),
-                "total_carbs": round(float(stats.total_carbs), 1)
-            }
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def get_earliest_analysis_date(telegram_id):
-        """
-        Получить дату самого раннего анализа пользователя
-        """
-        with get_db_session() as session:
-            earliest = session.query(func.min(FoodAnalysis.analysis_date)).join(User).filter(
-                User.telegram_id == telegram_id
-            ).scalar()
-
-            return earliest.date() if earliest else None
-
-    @staticmethod
-    @db_retry(max_retries=3)
-    def has_data_for_date(telegram_id, date):
-        """
-        Проверяет наличие данных за дату (оптимизированная версия)
-        """
-        with get_db_session() as session:
-            start_of_day = datetime.combine(date, time.min)
-            end_of_day = datetime.combine(date, time.max)
-
-            count = session.query(FoodAnalysis).join(User).filter(
-                User.telegram_id == telegram_id,
-                FoodAnalysis.analysis_date >= start_of_day,
-                FoodAnalysis.analysis_date <= end_of_day
-            ).count()
-
-            return count > 0
-
-    @staticmethod
-    def get_database_health():
-        """
-        Проверка состояния базы данных
-        """
-        try:
-            with get_db_session() as session:
-                # Простой запрос для проверки соединения (исправлено для SQLAlchemy 2.0)
-                from sqlalchemy import text
-                session.execute(text("SELECT 1"))
-
-                # Получаем статистику использования
-                if IS_POSTGRESQL:
-                    # PostgreSQL специфичные запросы
-                    result = session.execute(text("""
-                                                  SELECT (SELECT COUNT(*) FROM users)                                     as total_users,
-                                                         (SELECT COUNT(*) FROM food_analyses)                             as total_analyses,
-                                                         (SELECT COUNT(*) FROM user_subscriptions WHERE is_active = true) as active_subscriptions
-                                                  """)).fetchone()
-
-                    total_users, total_analyses, active_subscriptions = result
-                else:
-                    # SQLite совместимый запрос
-                    users_count = session.query(User).count()
-                    analyses_count = session.query(FoodAnalysis).count()
-                    subscriptions_count = session.query(UserSubscription).filter_by(is_active=True).count()
-                    total_users, total_analyses, active_subscriptions = users_count, analyses_count, subscriptions_count
-
-                return {
-                    'status': 'healthy',
-                    'database_type': 'PostgreSQL' if IS_POSTGRESQL else 'SQLite',
-                    'total_users': total_users,
-                    'total_analyses': total_analyses,
-                    'active_subscriptions': active_subscriptions,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-
-        except Exception as e:
-            logger.error(f"Database health check failed: {str(e)}")
-            return {
-                'status': 'unhealthy',
-                'error': str(e),
-                'timestamp': datetime.utcnow().isoformat(),
-                'total_users': 0,
-                'total_analyses': 0,
-                'active_subscriptions': 0
-            }
-
-    @staticmethod
-    def cleanup_old_data(days_to_keep=90):
-        """
-        Очистка старых данных (для оптимизации производительности)
-        """
-        try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-
-            with get_db_session() as session:
-                # Удаляем старые анализы еды
-                deleted_analyses = session.query(FoodAnalysis).filter(
-                    FoodAnalysis.analysis_date < cutoff_date
-                ).delete(synchronize_session=False)
-
-                # Удаляем неактивные подписки старше cutoff_date
-                deleted_subscriptions = session.query(UserSubscription).filter(
-                    UserSubscription.is_active == False,
-                    UserSubscription.end_date < cutoff_date
-                ).delete(synchronize_session=False)
-
-                logger.info(
-                    f"Cleanup completed: {deleted_analyses} analyses, {deleted_subscriptions} subscriptions deleted")
-
-                return {
-                    'deleted_analyses': deleted_analyses,
-                    'deleted_subscriptions': deleted_subscriptions,
-                    'cutoff_date': cutoff_date.isoformat()
-                }
-
-        except Exception as e:
-            logger.error(f"Data cleanup failed: {str(e)}")
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.exc import OperationalError, IntegrityError
+from sqlalchemy import text, func, select, delete, insert, update, case, extract
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta, time
+import time as _time
+import re
+import sys
+import os
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FREE_REQUESTS_LIMIT, IS_POSTGRESQL
+from database.models import User, UserSubscription, FoodAnalysis, UserDailyRollup, DB_UTC_NOW, init_db, ensure_food_analysis_partitions, fill_daily_rollup
+from monitoring.decorators import track_api_call
+
+logger = logging.getLogger(__name__)
+
+# Ошибки БД, при которых имеет смысл повторить попытку
+_RETRYABLE_ERROR_RE = re.compile(
+    r"database is locked|connection|timeout|deadlock|serialization failure",
+    re.IGNORECASE
+)
+
+# Сколько последних дней (включая текущий) пересчитывает сверка дневных агрегатов
+ROLLUP_RECONCILE_DAYS = 2
+
+# Кэш соответствия telegram_id -> users.id (значение для пользователя не меняется)
+USER_ID_CACHE_SIZE = 50000
+_user_id_cache = OrderedDict()
+_user_id_cache_lock = threading.Lock()
+
+# Инициализация базы данных и сессий
+engine = init_db()
+session_factory = sessionmaker(bind=engine)
+Session = scoped_session(session_factory)
+
+
+# Тип приема пищи по часу суток (индекс - час 0..23):
+# завтрак 5:00 - 10:59, обед 11:00 - 15:59, ужин 16:00 - 20:59, перекус 21:00 - 4:59
+_MEAL_TYPE_BY_HOUR = (
+    ("snack",) * 5 +
+    ("breakfast",) * 6 +
+    ("lunch",) * 5 +
+    ("dinner",) * 5 +
+    ("snack",) * 3
+)
+
+
+# То же разбиение по часам в виде SQL-выражения от текущего времени БД
+_db_hour = extract('hour', DB_UTC_NOW)
+_DB_MEAL_TYPE_NOW = case(
+    (_db_hour.between(5, 10), "breakfast"),
+    (_db_hour.between(11, 15), "lunch"),
+    (_db_hour.between(16, 20), "dinner"),
+    else_="snack"
+)
+
+
+def determine_meal_type(time):
+    """
+    Определяет тип приема пищи по времени
+
+    Args:
+        time (datetime): Время приема пищи
+
+    Returns:
+        str: Тип приема пищи (breakfast, lunch, dinner, snack)
+    """
+    return _MEAL_TYPE_BY_HOUR[time.hour]
+
+
+def db_retry(max_retries=3, retry_delay=0.5):
+    """
+    Декоратор для повторных попыток при ошибках БД
+    """
+
+    # Задержки между попытками (exponential backoff) считаются один раз
+    backoffs = tuple(retry_delay * (2 ** attempt) for attempt in range(max_retries))
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            last_exception = None
+
+            for attempt in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except (OperationalError, IntegrityError) as e:
+                    last_exception = e
+
+                    # Определяем, стоит ли повторять попытку
+                    if _RETRYABLE_ERROR_RE.search(str(e)):
+                        if attempt < max_retries - 1:
+                            logger.warning(f"Database retry {attempt + 1}/{max_retries} for {func.__name__}: {str(e)}")
+                            _time.sleep(backoffs[attempt])
+                            continue
+
+                    # Не повторяем для других типов ошибок
+                    logger.error(f"Database error in {func.__name__}: {str(e)}")
+                    raise
+                except Exception as e:
+                    logger.error(f"Unexpected error in {func.__name__}: {str(e)}")
+                    raise
+
+            # Если все попытки исчерпаны
+            logger.error(f"All {max_retries} retries failed for {func.__name__}")
+            raise last_exception
+
+        return wrapper
+
+    return decorator
+
+
+def _cache_user_id(telegram_id, user_id):
+    """
+    Запоминает ID пользователя в LRU-кэше
+    """
+    with _user_id_cache_lock:
+        _user_id_cache[telegram_id] = user_id
+        _user_id_cache.move_to_end(telegram_id)
+        if len(_user_id_cache) > USER_ID_CACHE_SIZE:
+            _user_id_cache.popitem(last=False)
+
+
+def _remember_new_user_id(session, telegram_id, user_id):
+    """
+    Откладывает кэширование ID пользователя, созданного в сессии, до успешного commit
+    """
+    session.info.setdefault('new_user_ids', {})[telegram_id] = user_id
+
+
+def _resolve_user_id(session, telegram_id):
+    """
+    Возвращает ID пользователя по telegram_id (из кэша или одним запросом), None если его нет
+    """
+    with _user_id_cache_lock:
+        user_id = _user_id_cache.get(telegram_id)
+        if user_id is not None:
+            _user_id_cache.move_to_end(telegram_id)
+            return user_id
+
+    user_id = session.execute(
+        select(User.id).where(User.telegram_id == telegram_id)
+    ).scalar_one_or_none()
+
+    if user_id is not None:
+        _cache_user_id(telegram_id, user_id)
+
+    return user_id
+
+
+def _dialect_insert(model):
+    """
+    INSERT с поддержкой ON CONFLICT для текущей СУБД
+    """
+    return postgresql.insert(model) if IS_POSTGRESQL else sqlite.insert(model)
+
+
+def _get_or_create_user_id(session, telegram_id):
+    """
+    Возвращает ID пользователя, создавая его при необходимости
+
+    Существующий пользователь берется из кэша или одним SELECT, строка users не изменяется.
+    Новый создается через INSERT ... ON CONFLICT DO NOTHING RETURNING; если его
+    параллельно создал другой запрос, ID перечитывается
+    """
+    user_id = _resolve_user_id(session, telegram_id)
+    if user_id is not None:
+        return user_id
+
+    user_id = session.execute(
+        _dialect_insert(User).values(telegram_id=telegram_id).on_conflict_do_nothing(
+            index_elements=[User.telegram_id]
+        ).returning(User.id)
+    ).scalar_one_or_none()
+
+    if user_id is None:
+        return _resolve_user_id(session, telegram_id)
+
+    _remember_new_user_id(session, telegram_id, user_id)
+
+    return user_id
+
+
+def _upsert_daily_rollup(session, user_id, day, calories, proteins, fats, carbs, analyses_count=1):
+    """
+    Добавляет значения анализов к дневному агрегату пользователя (INSERT ... ON CONFLICT DO UPDATE)
+    """
+    stmt = _dialect_insert(UserDailyRollup).values(
+        user_id=user_id,
+        day=day,
+        analyses_count=analyses_count,
+        calories=calories or 0,
+        proteins=proteins or 0,
+        fats=fats or 0,
+        carbs=carbs or 0
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyRollup.user_id, UserDailyRollup.day],
+        set_={
+            'analyses_count': UserDailyRollup.analyses_count + stmt.excluded.analyses_count,
+            'calories': UserDailyRollup.calories + stmt.excluded.calories,
+            'proteins': UserDailyRollup.proteins + stmt.excluded.proteins,
+            'fats': UserDailyRollup.fats + stmt.excluded.fats,
+            'carbs': UserDailyRollup.carbs + stmt.excluded.carbs
+        }
+    )
+    session.execute(stmt)
+
+
+def bulk_insert_food_analyses(session, rows, **values):
+    """
+    Вставка списка анализов одним многострочным INSERT ... RETURNING (executemany)
+
+    Args:
+        session: Сессия SQLAlchemy
+        rows (list): Словари значений колонок FoodAnalysis
+        **values: Общие для всех строк значения или SQL-выражения
+
+    Returns:
+        list: Строки (id, analysis_date) в порядке rows
+    """
+    if not rows:
+        return []
+
+    stmt = insert(FoodAnalysis)
+    if values:
+        stmt = stmt.values(**values)
+
+    return session.execute(
+        stmt.returning(FoodAnalysis.id, FoodAnalysis.analysis_date, sort_by_parameter_order=True),
+        rows
+    ).all()
+
+
+@contextmanager
+def get_db_session():
+    """
+    Context manager для безопасной работы с сессией БД
+    """
+    session = Session()
+    try:
+        yield session
+        session.commit()
+
+        # Кэшируем ID пользователей, созданных в этой транзакции
+        for telegram_id, user_id in session.info.pop('new_user_ids', {}).items():
+            _cache_user_id(telegram_id, user_id)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Database session error: {str(e)}")
+        raise
+    finally:
+        # Возвращаем соединение в пул и сбрасываем сессию потока
+        Session.remove()
+
+
+@contextmanager
+def get_readonly_session():
+    """
+    Context manager для запросов только на чтение
+
+    Соединение работает в режиме AUTOCOMMIT: без BEGIN/COMMIT на каждый запрос.
+    Используется отдельная сессия, не связанная с scoped-сессией потока
+    """
+    session = session_factory()
+    try:
+        session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        yield session
+    except Exception as e:
+        logger.error(f"Database read session error: {str(e)}")
+        raise
+    finally:
+        session.close()
+
+
+class DatabaseManager:
+    """Класс для управления базой данных с оптимизированными запросами"""
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_user_profile(telegram_id):
+        """
+        Получает профиль пользователя
+        """
+        with get_readonly_session() as session:
+            user = session.execute(
+                select(User).where(User.telegram_id == telegram_id)
+            ).scalar_one_or_none()
+            if not user:
+                return None
+
+            return {
+                'gender': user.gender,
+                'age': user.age,
+                'weight': user.weight,
+                'height': user.height,
+                'activity_level': user.activity_level,
+                'daily_calories': user.daily_calories,
+                'daily_proteins': user.daily_proteins,
+                'daily_fats': user.daily_fats,
+                'daily_carbs': user.daily_carbs
+            }
+
+    @staticmethod
+    def calculate_daily_norms(gender, age, weight, height, activity_level, goal='maintenance'):
+        """
+        Рассчитывает рекомендуемые дневные нормы КБЖУ по формуле Миффлина-Сан Жеора
+        """
+        profile = User(gender=gender, age=age, weight=weight, height=height,
+                       activity_level=activity_level, goal=goal)
+
+        return {
+            'daily_calories': profile.computed_daily_calories,
+            'daily_proteins': profile.computed_daily_proteins,
+            'daily_fats': profile.computed_daily_fats,
+            'daily_carbs': profile.computed_daily_carbs
+        }
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def update_user_profile(telegram_id, **kwargs):
+        """
+        Обновляет профиль пользователя с автоматическим расчетом норм
+        """
+        with get_db_session() as session:
+            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            if not user:
+                return None
+
+            # Обновляем переданные поля
+            for field, value in kwargs.items():
+                if hasattr(user, field) and value is not None:
+                    setattr(user, field, value)
+
+            # Автоматический расчет норм, если все параметры указаны
+            if (user.gender and user.age and user.weight and user.height and user.activity_level and
+                    'daily_calories' not in kwargs):
+                goal = user.goal or 'maintenance'
+                norms = DatabaseManager.calculate_daily_norms(
+                    user.gender, user.age, user.weight, user.height, user.activity_level, goal
+                )
+
+                user.daily_calories = norms['daily_calories']
+                user.daily_proteins = norms['daily_proteins']
+                user.daily_fats = norms['daily_fats']
+                user.daily_carbs = norms['daily_carbs']
+
+            # Возвращаем текущие нормы
+            return {
+                'daily_calories': user.daily_calories,
+                'daily_proteins': user.daily_proteins,
+                'daily_fats': user.daily_fats,
+                'daily_carbs': user.daily_carbs
+            }
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def recompute_all_norms():
+        """
+        Пересчитывает дневные нормы КБЖУ всех пользователей с заполненным профилем
+
+        Нормы вычисляются в самой БД одним UPDATE по выражениям User.computed_daily_*
+        """
+        with get_db_session() as session:
+            result = session.execute(
+                update(User).where(
+                    User.gender.isnot(None),
+                    User.age.isnot(None),
+                    User.weight.isnot(None),
+                    User.height.isnot(None),
+                    User.activity_level.isnot(None)
+                ).values(
+                    daily_calories=User.computed_daily_calories,
+                    daily_proteins=User.computed_daily_proteins,
+                    daily_fats=User.computed_daily_fats,
+                    daily_carbs=User.computed_daily_carbs
+                ).execution_options(synchronize_session=False)
+            )
+
+            logger.info(f"Recomputed daily norms for {result.rowcount} users")
+            return result.rowcount
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_user_daily_norms(telegram_id):
+        """
+        Получает дневные нормы КБЖУ пользователя
+        """
+        with get_readonly_session() as session:
+            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            if not user or not user.daily_calories:
+                return None
+
+            return {
+                'daily_calories': user.daily_calories,
+                'daily_proteins': user.daily_proteins,
+                'daily_fats': user.daily_fats,
+                'daily_carbs': user.daily_carbs,
+                'has_full_profile': bool(
+                    user.gender and user.age and user.weight and
+                    user.height and user.activity_level
+                )
+            }
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_or_create_user(telegram_id, username=None, first_name=None, last_name=None):
+        """
+        Получить или создать пользователя (оптимизированная версия)
+        """
+        with get_db_session() as session:
+            # Сначала пытаемся найти существующего пользователя
+            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+
+            if not user:
+                # Создаем нового пользователя
+                user = User(
+                    telegram_id=telegram_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name
+                )
+                session.add(user)
+                session.flush()  # Получаем ID без commit
+                logger.info(f"Created new user: {telegram_id}")
+
+            _remember_new_user_id(session, telegram_id, user.id)
+
+            return user
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_nutrition_stats_for_date(telegram_id, date, include_items=True):
+        """
+        Оптимизированное получение статистики за дату
+
+        Суммы по приемам пищи считаются в БД (GROUP BY meal_type),
+        список блюд загружается только при include_items=True
+        """
+        with get_readonly_session() as session:
+            user_id = _resolve_user_id(session, telegram_id)
+            if user_id is None:
+                return None
+
+            # Определяем границы дня (полуоткрытый интервал [start, next_day))
+            start_of_day = datetime.combine(date, time.min)
+            next_day = start_of_day + timedelta(days=1)
+
+            day_filter = (
+                FoodAnalysis.user_id == user_id,
+                FoodAnalysis.analysis_date >= start_of_day,
+                FoodAnalysis.analysis_date < next_day
+            )
+            # Пустой или отсутствующий тип приема пищи считается перекусом
+            meal_type_expr = func.coalesce(func.nullif(FoodAnalysis.meal_type, ''), 'snack')
+
+            # Агрегация по типам приема пищи на стороне БД
+            grouped = session.query(
+                meal_type_expr.label('meal_type'),
+                func.count(FoodAnalysis.id).label('count'),
+                func.coalesce(func.sum(FoodAnalysis.calories), 0).label('calories'),
+                func.coalesce(func.sum(FoodAnalysis.proteins), 0).label('proteins'),
+                func.coalesce(func.sum(FoodAnalysis.fats), 0).label('fats'),
+                func.coalesce(func.sum(FoodAnalysis.carbs), 0).label('carbs')
+            ).filter(*day_filter).group_by(meal_type_expr).all()
+
+            # Инициализация статистики
+            meal_stats = {
+                meal_type: {"count": 0, "calories": 0, "proteins": 0, "fats": 0, "carbs": 0, "items": []}
+                for meal_type in ["breakfast", "lunch", "dinner", "snack"]
+            }
+            meal_stats["total"] = {"count": 0, "calories": 0, "proteins": 0, "fats": 0, "carbs": 0, "items": []}
+
+            for row in grouped:
+                for key in (row.meal_type, "total"):
+                    meal_stats[key]["count"] += row.count
+                    meal_stats[key]["calories"] += float(row.calories)
+                    meal_stats[key]["proteins"] += float(row.proteins)
+                    meal_stats[key]["fats"] += float(row.fats)
+                    meal_stats[key]["carbs"] += float(row.carbs)
+
+            # Детализация по блюдам (только нужные колонки, без ORM-объектов)
+            if include_items and meal_stats["total"]["count"]:
+                items = session.query(
+                    meal_type_expr.label('meal_type'),
+                    FoodAnalysis.food_name,
+                    FoodAnalysis.calories,
+                    FoodAnalysis.proteins,
+                    FoodAnalysis.fats,
+                    FoodAnalysis.carbs,
+                    FoodAnalysis.analysis_date,
+                    FoodAnalysis.portion_weight
+                ).filter(*day_filter).order_by(FoodAnalysis.analysis_date).all()
+
+                for item in items:
+                    item_info = {
+                        "name": item.food_name,
+                        "calories": item.calories,
+                        "proteins": item.proteins,
+                        "fats": item.fats,
+                        "carbs": item.carbs,
+                        "time": item.analysis_date.strftime("%H:%M"),
+                        "portion_weight": item.portion_weight
+                    }
+                    meal_stats[item.meal_type]["items"].append(item_info)
+                    meal_stats["total"]["items"].append(item_info)
+
+            # Округляем значения
+            for meal_type in meal_stats:
+                for nutrient in ["calories", "proteins", "fats", "carbs"]:
+                    meal_stats[meal_type][nutrient] = round(meal_stats[meal_type][nutrient], 1)
+
+            return meal_stats
+
+    @staticmethod
+    def _save_food_analyses(telegram_id, items):
+        """
+        Сохраняет список анализов одной транзакцией: один upsert пользователя,
+        многострочный INSERT ... RETURNING и обновление дневных агрегатов
+
+        Если время анализа не передано, оно и тип приема пищи берутся по часам БД
+        """
+        if not items:
+            return []
+
+        with get_db_session() as session:
+            # Получаем или создаем пользователя одним запросом
+            user_id = _get_or_create_user_id(session, telegram_id)
+
+            timed_rows, untimed_rows = [], []
+            for position, item in enumerate(items):
+                row = {
+                    'user_id': user_id,
+                    'food_name': item.get('food_name'),
+                    'calories': item.get('calories'),
+                    'proteins': item.get('proteins'),
+                    'fats': item.get('fats'),
+                    'carbs': item.get('carbs'),
+                    'image_path': item.get('image_path'),
+                    'portion_weight': item.get('portion_weight')
+                }
+
+                analysis_time = item.get('analysis_time')
+                if analysis_time is None:
+                    untimed_rows.append((position, row))
+                else:
+                    row['analysis_date'] = analysis_time
+                    row['meal_type'] = determine_meal_type(analysis_time)
+                    timed_rows.append((position, row))
+
+            inserted = [None] * len(items)
+
+            result = bulk_insert_food_analyses(session, [row for _, row in timed_rows])
+            for (position, _), saved in zip(timed_rows, result):
+                inserted[position] = saved
+
+            result = bulk_insert_food_analyses(
+                session, [row for _, row in untimed_rows],
+                analysis_date=DB_UTC_NOW, meal_type=_DB_MEAL_TYPE_NOW
+            )
+            for (position, _), saved in zip(untimed_rows, result):
+                inserted[position] = saved
+
+            # Дневные агрегаты по фактическим датам сохраненных анализов
+            rollup = {}
+            for item, saved in zip(items, inserted):
+                day = rollup.setdefault(
+                    saved.analysis_date.date(),
+                    {'count': 0, 'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0}
+                )
+                day['count'] += 1
+                for nutrient in ('calories', 'proteins', 'fats', 'carbs'):
+                    day[nutrient] += item.get(nutrient) or 0
+
+            analysis_ids = [saved.id for saved in inserted]
+
+            for day, totals in rollup.items():
+                _upsert_daily_rollup(
+                    session, user_id, day, totals['calories'], totals['proteins'],
+                    totals['fats'], totals['carbs'], analyses_count=totals['count']
+                )
+
+            logger.info(f"Saved food analyses {analysis_ids} for user {telegram_id}")
+
+            return analysis_ids
+
+    @staticmethod
+    @track_api_call('db_save_food_analyses')
+    @db_retry(max_retries=3)
+    def save_food_analyses(telegram_id, items):
+        """
+        Пакетное сохранение анализов еды
+
+        Args:
+            telegram_id (int): Telegram ID пользователя
+            items (list): Список словарей с ключами food_name, calories, proteins, fats, carbs
+                и необязательными image_path, portion_weight, analysis_time
+
+        Returns:
+            list: ID сохраненных анализов в порядке items
+        """
+        return DatabaseManager._save_food_analyses(telegram_id, items)
+
+    @staticmethod
+    @track_api_call('db_save_food_analysis')
+    @db_retry(max_retries=3)
+    def save_food_analysis(telegram_id, food_name, calories, proteins, fats, carbs,
+                           image_path=None, portion_weight=None, analysis_time=None):
+        """
+        Оптимизированное сохранение анализа еды
+        """
+        analysis_ids = DatabaseManager._save_food_analyses(telegram_id, [{
+            'food_name': food_name,
+            'calories': calories,
+            'proteins': proteins,
+            'fats': fats,
+            'carbs': carbs,
+            'image_path': image_path,
+            'portion_weight': portion_weight,
+            'analysis_time': analysis_time
+        }])
+
+        return analysis_ids[0]
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def check_subscription_status(telegram_id):
+        """
+        ИСПРАВЛЕННАЯ проверка статуса подписки с автоочисткой
+        """
+        with get_db_session() as session:
+            user_id = _resolve_user_id(session, telegram_id)
+            if user_id is None:
+                return False
+
+            # Московское время (UTC+3)
+            now_msk = datetime.utcnow() + timedelta(hours=3)
+
+            # Находим и деактивируем истекшие подписки этого пользователя
+            expired_subscriptions = session.execute(
+                select(UserSubscription).where(
+                    UserSubscription.user_id == user_id,
+                    UserSubscription.is_active == True,
+                    UserSubscription.end_date <= now_msk
+                )
+            ).scalars().all()
+
+            # Деактивируем истекшие подписки
+            for subscription in expired_subscriptions:
+                subscription.is_active = False
+                logger.info(f"Деактивирована истекшая подписка для пользователя {telegram_id}")
+
+            # ИСПРАВЛЕНИЕ: Сначала commit изменений
+            if expired_subscriptions:
+                session.commit()
+
+            # Проверяем есть ли активные подписки (ПОСЛЕ commit'а)
+            active_subscription_id = session.execute(
+                select(UserSubscription.id).where(
+                    UserSubscription.user_id == user_id,
+                    UserSubscription.is_active == True,
+                    UserSubscription.end_date > now_msk
+                ).limit(1)
+            ).scalar_one_or_none()
+
+            return active_subscription_id is not None
+
+    @staticmethod
+    @track_api_call('db_add_subscription')
+    @db_retry(max_retries=3)
+    def add_subscription(telegram_id, months=1, payment_id=None):
+        """
+        Добавить подписку пользователю
+
+        Returns:
+            Row: Строка новой подписки (id, user_id, start_date, end_date, is_active, payment_id)
+        """
+        with get_db_session() as session:
+            user_id = _get_or_create_user_id(session, telegram_id)
+
+            moscow_time = datetime.utcnow() + timedelta(hours=3)
+            end_date = moscow_time + timedelta(days=30 * months)
+
+            # INSERT ... RETURNING: данные подписки доступны и после закрытия сессии
+            subscription = session.execute(
+                insert(UserSubscription).values(
+                    user_id=user_id,
+                    end_date=end_date,
+                    payment_id=payment_id
+                ).returning(
+                    UserSubscription.id,
+                    UserSubscription.user_id,
+                    UserSubscription.start_date,
+                    UserSubscription.end_date,
+                    UserSubscription.is_active,
+                    UserSubscription.payment_id
+                )
+            ).one()
+
+            logger.info(f"Added subscription for user {telegram_id}, {months} months")
+            return subscription
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_remaining_free_requests(telegram_id):
+        """
+        Оптимизированное получение оставшихся бесплатных запросов
+        """
+        # Сначала проверяем подписку
+        if DatabaseManager.check_subscription_status(telegram_id):
+            return float('inf')
+
+        with get_readonly_session() as session:
+            user_id = _resolve_user_id(session, telegram_id)
+            if user_id is None:
+                return FREE_REQUESTS_LIMIT
+
+            # Подсчитываем использованные запросы одним запросом (без JOIN к users)
+            used_requests = session.execute(
+                select(func.count(FoodAnalysis.id)).where(FoodAnalysis.user_id == user_id)
+            ).scalar_one()
+
+            remaining = max(0, FREE_REQUESTS_LIMIT - used_requests)
+            return remaining
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_user_statistics(telegram_id):
+        """
+        Оптимизированная общая статистика пользователя
+
+        Суммирует дневные агрегаты (user_daily_rollup) вместо всех анализов пользователя
+        """
+        with get_readonly_session() as session:
+            user_id = _resolve_user_id(session, telegram_id)
+
+            stats = session.query(
+                func.coalesce(func.sum(UserDailyRollup.analyses_count), 0).label('total_analyses'),
+                func.coalesce(func.sum(UserDailyRollup.calories), 0).label('total_calories'),
+                func.coalesce(func.sum(UserDailyRollup.proteins), 0).label('total_proteins'),
+                func.coalesce(func.sum(UserDailyRollup.fats), 0).label('total_fats'),
+                func.coalesce(func.sum(UserDailyRollup.carbs), 0).label('total_carbs')
+            ).filter(UserDailyRollup.user_id == user_id).first()
+
+            if not stats:
+                return None
+
+            return {
+                "total_analyses": int(stats.total_analyses),
+                "total_calories": round(float(stats.total_calories), 1),
+                "total_proteins": round(float(stats.total_proteins), 1),
+                "total_fats": round(float(stats.total_fats), 1),
+                "total_carbs": round(float(stats.total_carbs), 1)
+            }
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def get_earliest_analysis_date(telegram_id):
+        """
+        Получить дату самого раннего анализа пользователя
+        """
+        with get_readonly_session() as session:
+            user_id = _resolve_user_id(session, telegram_id)
+            if user_id is None:
+                return None
+
+            earliest = session.query(func.min(FoodAnalysis.analysis_date)).filter(
+                FoodAnalysis.user_id == user_id
+            ).scalar()
+
+            return earliest.date() if earliest else None
+
+    @staticmethod
+    @db_retry(max_retries=3)
+    def has_data_for_date(telegram_id, date):
+        """
+        Проверяет наличие данных за дату (оптимизированная версия)
+        """
+        with get_readonly_session() as session:
+            start_of_day = datetime.combine(date, time.min)
+            next_day = start_of_day + timedelta(days=1)
+
+            user_id = _resolve_user_id(session, telegram_id)
+            if user_id is None:
+                return False
+
+            # Достаточно найти одну запись, считать все не нужно
+            first_id = session.execute(
+                select(FoodAnalysis.id).where(
+                    FoodAnalysis.user_id == user_id,
+                    FoodAnalysis.analysis_date >= start_of_day,
+                    FoodAnalysis.analysis_date < next_day
+                ).limit(1)
+            ).scalar_one_or_none()
+
+            return first_id is not None
+
+    @staticmethod
+    def get_database_health():
+        """
+        Проверка состояния базы данных
+        """
+        try:
+            with get_db_session() as session:
+                # Получаем статистику использования (запрос заодно проверяет соединение)
+                if IS_POSTGRESQL:
+                    # Один запрос: оценки числа строк из pg_class вместо полного COUNT(*)
+                    # по большим таблицам (для food_analyses - сумма по секциям),
+                    # точный COUNT только по активным подпискам
+                    result = session.execute(text("""
+                                                  SELECT (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class
+                                                          WHERE oid = 'users'::regclass)                  as total_users,
+                                                         (SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class
+                                                          WHERE oid = 'food_analyses'::regclass
+                                                             OR oid IN (SELECT inhrelid FROM pg_inherits
+                                                                        WHERE inhparent = 'food_analyses'::regclass)) as total_analyses,
+                                                         (SELECT COUNT(*) FROM user_subscriptions WHERE is_active = true) as active_subscriptions
+                                                  """)).fetchone()
+
+                    total_users, total_analyses, active_subscriptions = result
+                else:
+                    # SQLite совместимый запрос
+                    users_count = session.query(User).count()
+                    analyses_count = session.query(FoodAnalysis).count()
+                    subscriptions_count = session.query(UserSubscription).filter_by(is_active=True).count()
+                    total_users, total_analyses, active_subscriptions = users_count, analyses_count, subscriptions_count
+
+                return {
+                    'status': 'healthy',
+                    'database_type': 'PostgreSQL' if IS_POSTGRESQL else 'SQLite',
+                    'total_users': total_users,
+                    'total_analyses': total_analyses,
+                    'active_subscriptions': active_subscriptions,
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+
+        except Exception as e:
+            logger.error(f"Database health check failed: {str(e)}")
+            return {
+                'status': 'unhealthy',
+                'error': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'total_users': 0,
+                'total_analyses': 0,
+                'active_subscriptions': 0
+            }
+
+    @staticmethod
+    def cleanup_old_data(days_to_keep=90):
+        """
+        Очистка старых данных (для оптимизации производительности)
+        """
+        try:
+            # Граница по полуночи: анализы и дневные агрегаты удаляются за одни и те же целые дни
+            cutoff_date = datetime.combine(datetime.utcnow().date() - timedelta(days=days_to_keep), time.min)
+
+            with get_db_session() as session:
+                # Удаляем старые анализы еды
+                deleted_analyses = session.query(FoodAnalysis).filter(
+                    FoodAnalysis.analysis_date < cutoff_date
+                ).delete(synchronize_session=False)
+
+                # Удаляем дневные агрегаты за удаленные дни
+                session.query(UserDailyRollup).filter(
+                    UserDailyRollup.day < cutoff_date.date()
+                ).delete(synchronize_session=False)
+
+                # Удаляем неактивные подписки старше cutoff_date
+                deleted_subscriptions = session.query(UserSubscription).filter(
+                    UserSubscription.is_active == False,
+                    UserSubscription.end_date < cutoff_date
+                ).delete(synchronize_session=False)
+
+                logger.info(
+                    f"Cleanup completed: {deleted_analyses} analyses, {deleted_subscriptions} subscriptions deleted")
+
+                return {
+                    'deleted_analyses': deleted_analyses,
+                    'deleted_subscriptions': deleted_subscriptions,
+                    'cutoff_date': cutoff_date.isoformat()
+                }
+
+        except Exception as e:
+            logger.error(f"Data cleanup failed: {str(e)}")
+            raise
+
+    @staticmethod
+    def reconcile_daily_rollup(days=ROLLUP_RECONCILE_DAYS):
+        """
+        Сверка дневных агрегатов последних дней с food_analyses (страховка от ручных правок)
+
+        Пересчитываются только дни начиная с (сегодня - days + 1), без полного прохода по food_analyses.
+        На время пересчета таблица агрегатов закрыта для upsert параллельных сохранений:
+        иначе сохранение между DELETE и INSERT потерялось бы или учлось дважды
+        """
+        try:
+            since = datetime.combine(datetime.utcnow().date() - timedelta(days=days - 1), time.min)
+
+            with get_db_session() as session:
+                if IS_POSTGRESQL:
+                    # SHARE ROW EXCLUSIVE конфликтует с ROW EXCLUSIVE у INSERT ... ON CONFLICT:
+                    # сохранения ждут окончания сверки, а ее INSERT ... SELECT видит все завершенные
+                    session.execute(text("LOCK TABLE user_daily_rollup IN SHARE ROW EXCLUSIVE MODE"))
+
+                session.execute(delete(UserDailyRollup).where(UserDailyRollup.day >= since.date()))
+                rows = fill_daily_rollup(session, since)
+
+                logger.info(f"Daily rollup reconciled since {since.date()}: {rows} rows")
+
+                return rows
+
+        except Exception as e:
+            logger.error(f"Daily rollup reconcile failed: {str(e)}")
+            raise
+
+    @staticmethod
+    def ensure_partitions():
+        """
+        Заблаговременное создание секций food_analyses на следующие месяцы
+        """
+        try:
+            return ensure_food_analysis_partitions(engine)
+
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {str(e)}")
             raise
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Разовые миграции схемы уже существующей БД
+
+Запуск перед стартом новой версии: python -m database.migrations
+
+create_all() при инициализации создает индексы только вместе с новыми таблицами.
+Индексы, добавленные позже, докатываются этим скриптом: в PostgreSQL через
+CREATE INDEX CONCURRENTLY на соединении в режиме AUTOCOMMIT, без блокировки записи
+"""
+import sys
+import os
+import logging
+
+from sqlalchemy import text
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import IS_POSTGRESQL
+from database.models import Base, create_database_engine
+
+logger = logging.getLogger(__name__)
+
+# Индексы, замененные новыми определениями: старый индекс -> индекс-замена.
+# Старый удаляется из уже существующей БД только после построения замены
+REPLACED_INDEXES = {
+    'idx_user_date': 'idx_fa_user_date',
+    'idx_active_subscriptions': 'idx_active_subscriptions_partial',
+    'idx_subs_user_active': 'idx_active_subscriptions_partial',
+}
+
+
+def _is_partitioned(conn, table_name):
+    """Является ли таблица секционированной (CONCURRENTLY для нее не поддерживается)"""
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+        {'name': table_name}
+    ).first() is not None
+
+
+def _invalid_indexes(conn):
+    """
+    Имена индексов, оставшихся невалидными после прерванного CREATE INDEX CONCURRENTLY
+
+    Такой индекс существует в каталоге, но не используется планировщиком
+    """
+    if not IS_POSTGRESQL:
+        return set()
+
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid AND c.relnamespace = 'public'::regnamespace"
+    )).scalars())
+
+
+def create_missing_indexes(conn):
+    """
+    Создание индексов моделей, которых еще нет в существующих таблицах
+
+    Уже существующие индексы пропускаются, поэтому миграцию можно запускать повторно
+    """
+    created = []
+    invalid = _invalid_indexes(conn)
+
+    for table in Base.metadata.sorted_tables:
+        if not conn.dialect.has_table(conn, table.name):
+            # Новую таблицу вместе с индексами создаст init_db()
+            continue
+
+        partitioned = IS_POSTGRESQL and _is_partitioned(conn, table.name)
+        table_created = []
+
+        for index in table.indexes:
+            if index.name in invalid and not partitioned:
+                # Прерванное построение: удаляем и строим индекс заново
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                logger.warning(f"Dropped invalid index {index.name}, rebuilding")
+            elif conn.dialect.has_index(conn, table.name, index.name):
+                continue
+
+            if partitioned:
+                # Секционированная таблица создается только в новой БД сразу со всеми индексами;
+                # новый индекс по ней строится вручную по секциям (CREATE INDEX ON ONLY + ATTACH PARTITION)
+                logger.warning(f"Index {index.name} on partitioned table {table.name} must be built manually")
+                continue
+
+            pg_options = index.dialect_options['postgresql']
+            pg_options['concurrently'] = IS_POSTGRESQL
+            try:
+                index.create(conn)
+            finally:
+                pg_options['concurrently'] = False
+
+            table_created.append(index.name)
+            logger.info(f"Created index {index.name} on {table.name}")
+
+        # Обновляем статистику планировщика после построения индексов
+        if table_created and IS_POSTGRESQL:
+            conn.execute(text(f"ANALYZE {table.name}"))
+
+        created.extend(table_created)
+
+    return created
+
+
+def drop_replaced_indexes(conn):
+    """
+    Удаление индексов, замененных новыми определениями
+
+    Старый индекс удаляется, только если замена уже построена и валидна:
+    запросы ни в какой момент не остаются без подходящего индекса
+    """
+    concurrently = " CONCURRENTLY" if IS_POSTGRESQL else ""
+    invalid = _invalid_indexes(conn)
+    indexes = {index.name: table.name for table in Base.metadata.sorted_tables for index in table.indexes}
+    dropped = []
+
+    for index_name, replacement in REPLACED_INDEXES.items():
+        table_name = indexes[replacement]
+        if not conn.dialect.has_table(conn, table_name):
+            continue
+        if replacement in invalid or not conn.dialect.has_index(conn, table_name, replacement):
+            logger.warning(f"Keeping index {index_name}: replacement {replacement} is not built")
+            continue
+        if conn.dialect.has_index(conn, table_name, index_name):
+            conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {index_name}"))
+            dropped.append(index_name)
+            logger.info(f"Dropped index {index_name}, replaced by {replacement}")
+
+    return dropped
+
+
+def run_migrations(engine=None):
+    """
+    Применение миграций индексов к существующей БД
+    """
+    engine = engine or create_database_engine()
+
+    # CREATE/DROP INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if IS_POSTGRESQL:
+            # Построение индекса по большой таблице дольше statement_timeout соединений приложения
+            conn.execute(text("SET statement_timeout = 0"))
+
+        created = create_missing_indexes(conn)
+        drop_replaced_indexes(conn)
+
+    logger.info(f"Migrations completed, created indexes: {', '.join(created) or 'none'}")
+    return created
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    run_migrations()
@@ -1,174 +1,478 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey, create_engine, Index
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from sqlalchemy.pool import QueuePool
-from datetime import datetime
-import sys
-import os
-import logging
-
-# Добавляем корневую директорию проекта в путь для импорта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATABASE_URL, IS_POSTGRESQL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
-
-logger = logging.getLogger(__name__)
-
-Base = declarative_base()
-
-
-class User(Base):
-    """Модель пользователя"""
-    __tablename__ = 'users'
-
-    id = Column(Integer, primary_key=True)
-    telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)  # Изменено на BigInteger
-    username = Column(String(255), nullable=True)  # Ограничена длина для PostgreSQL
-    first_name = Column(String(255), nullable=True)
-    last_name = Column(String(255), nullable=True)
-    registration_date = Column(DateTime, default=datetime.utcnow, index=True)  # Добавлен индекс
-
-    # Поля для дневных норм КБЖУ
-    gender = Column(String(10), nullable=True)  # 'male' или 'female'
-    age = Column(Integer, nullable=True)
-    weight = Column(Float, nullable=True)  # в кг
-    height = Column(Float, nullable=True)  # в см
-    activity_level = Column(Float, nullable=True)  # коэффициент активности (1.2 - 1.9)
-    goal = Column(String(20), nullable=True)  # 'weight_loss', 'maintenance', 'weight_gain'
-
-    # Расчетные нормы (могут быть заданы вручную или расчитаны)
-    daily_calories = Column(Float, nullable=True)
-    daily_proteins = Column(Float, nullable=True)
-    daily_fats = Column(Float, nullable=True)
-    daily_carbs = Column(Float, nullable=True)
-
-    # Отношения
-    subscriptions = relationship("UserSubscription", back_populates="user", cascade="all, delete-orphan")
-    food_analyses = relationship("FoodAnalysis", back_populates="user", cascade="all, delete-orphan")
-
-    def __repr__(self):
-        return f"<User(telegram_id={self.telegram_id}, username={self.username})>"
-
-
-class UserSubscription(Base):
-    """Модель подписки пользователя"""
-    __tablename__ = 'user_subscriptions'
-
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
-    start_date = Column(DateTime, default=datetime.utcnow, index=True)
-    end_date = Column(DateTime, nullable=False, index=True)  # Часто используется в запросах
-    is_active = Column(Boolean, default=True, index=True)
-    payment_id = Column(String(255), nullable=True, index=True)
-
-    # Отношения
-    user = relationship("User", back_populates="subscriptions")
-
-    # Составной индекс для быстрого поиска активных подписок
-    __table_args__ = (
-        Index('idx_active_subscriptions', 'user_id', 'is_active', 'end_date'),
-    )
-
-    def __repr__(self):
-        return f"<UserSubscription(user_id={self.user_id}, active={self.is_active}, end_date={self.end_date})>"
-
-
-class FoodAnalysis(Base):
-    """Модель анализа пищи"""
-    __tablename__ = 'food_analyses'
-
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
-    analysis_date = Column(DateTime, default=datetime.utcnow, index=True)  # Часто используется в запросах
-    food_name = Column(String(500), nullable=True)  # Увеличена длина
-    calories = Column(Float, nullable=True)
-    proteins = Column(Float, nullable=True)
-    fats = Column(Float, nullable=True)
-    carbs = Column(Float, nullable=True)
-    image_path = Column(String(1000), nullable=True)  # Путь к изображению
-    portion_weight = Column(Float, nullable=True)  # Вес порции
-    meal_type = Column(String(20), nullable=True, index=True)  # 'breakfast', 'lunch', 'dinner', 'snack'
-
-    # Отношения
-    user = relationship("User", back_populates="food_analyses")
-
-    # Составные индексы для оптимизации запросов статистики
-    __table_args__ = (
-        Index('idx_user_date', 'user_id', 'analysis_date'),
-        Index('idx_user_meal_date', 'user_id', 'meal_type', 'analysis_date'),
-    )
-
-    def __repr__(self):
-        return f"<FoodAnalysis(id={self.id}, food_name={self.food_name}, calories={self.calories})>"
-
-
-def create_database_engine():
-    """
-    Создание engine базы данных с оптимальными настройками
-    """
-    try:
-        if IS_POSTGRESQL:
-            # PostgreSQL с connection pooling
-            engine = create_engine(
-                DATABASE_URL,
-                poolclass=QueuePool,
-                pool_size=DB_POOL_SIZE,
-                max_overflow=DB_MAX_OVERFLOW,
-                pool_timeout=DB_POOL_TIMEOUT,
-                pool_recycle=DB_POOL_RECYCLE,
-                pool_pre_ping=True,  # Проверка соединений
-                echo=False,  # Отключаем SQL логи в продакшене
-                future=True  # Используем новый стиль SQLAlchemy 2.0
-            )
-            logger.info(f"PostgreSQL engine created with pool_size={DB_POOL_SIZE}")
-        else:
-            # SQLite fallback (для разработки)
-            engine = create_engine(
-                DATABASE_URL,
-                pool_timeout=DB_POOL_TIMEOUT,
-                echo=False,
-                future=True,
-                # SQLite специфичные настройки
-                connect_args={
-                    "check_same_thread": False,
-                    "timeout": 20
-                }
-            )
-            logger.info("SQLite engine created (fallback mode)")
-
-        return engine
-
-    except Exception as e:
-        logger.error(f"Failed to create database engine: {str(e)}")
-        raise
-
-
-# Инициализация базы данных
-def init_db():
-    """
-    Инициализация базы данных с созданием всех таблиц
-    """
-    try:
-        engine = create_database_engine()
-
-        # Создание всех таблиц
-        Base.metadata.create_all(engine)
-        logger.info("Database tables created successfully")
-
-        return engine
-
-    except Exception as e:
-        logger.error(f"Database initialization failed: {str(e)}")
-        raise
-
-
-def get_database_info():
-    """
-    Получение информации о текущей конфигурации базы данных
-    """
-    return {
-        'database_type': 'PostgreSQL' if IS_POSTGRESQL else 'SQLite',
-        'database_url': DATABASE_URL.split('@')[0] + '@***' if '@' in DATABASE_URL else 'SQLite file',
-        'pool_size': DB_POOL_SIZE if IS_POSTGRESQL else 'N/A',
-        'max_overflow': DB_MAX_OVERFLOW if IS_POSTGRESQL else 'N/A',
-        'pool_timeout': DB_POOL_TIMEOUT
-    }
\ No newline at end of file
+from sqlalchemy import Integer, BigInteger, String, Float, Boolean, Date, DateTime, ForeignKey, Numeric, create_engine, Index, text, func, event, case, cast, and_, select, insert
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.pool import QueuePool, NullPool
+from datetime import datetime, date
+from typing import List, Optional
+import sys
+import os
+import logging
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from config import DATABASE_URL, IS_POSTGRESQL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+
+# Необязательные настройки пула; за PgBouncer (transaction mode) рекомендуется
+# DB_POOL_CLASS = 'null' и DB_POOL_PRE_PING = False
+DB_POOL_PRE_PING = getattr(config, 'DB_POOL_PRE_PING', True)
+DB_POOL_CLASS = getattr(config, 'DB_POOL_CLASS', 'queue')
+
+logger = logging.getLogger(__name__)
+
+
+class Base(DeclarativeBase):
+    """Базовый класс моделей (типизированное декларативное отображение SQLAlchemy 2.0)"""
+
+
+# Текущее время UTC по часам БД (timestamp без часового пояса)
+DB_UTC_NOW = func.timezone('UTC', func.now()) if IS_POSTGRESQL else func.current_timestamp()
+
+# Параметры соединений PostgreSQL: имя приложения в pg_stat_activity
+# и ограничение времени выполнения запроса (мс)
+DB_APPLICATION_NAME = 'kanki'
+DB_STATEMENT_TIMEOUT_MS = 5000
+
+# Размер LRU-кэша скомпилированных SQL-выражений engine
+DB_QUERY_CACHE_SIZE = 1000
+
+
+# Цели питания: множитель калорий и доли белков, жиров, углеводов в калорийности
+NORM_GOAL_FACTORS = {
+    'weight_loss': (0.8, 0.35, 0.30, 0.35),
+    'maintenance': (1.0, 0.30, 0.30, 0.40),
+    'weight_gain': (1.15, 0.30, 0.25, 0.45),
+}
+
+# Норма -> (индекс доли в NORM_GOAL_FACTORS или None для калорий, ккал в грамме)
+_NORM_PARTS = {
+    'calories': (None, 1),
+    'proteins': (1, 4),
+    'fats': (2, 9),
+    'carbs': (3, 4),
+}
+
+
+def _norm_value(user, norm):
+    """Норма по формуле Миффлина-Сан Жеора для объекта User (None при неполном профиле)"""
+    if not (user.gender and user.age and user.weight and user.height and user.activity_level):
+        return None
+
+    bmr = 10 * user.weight + 6.25 * user.height - 5 * user.age + (5 if user.gender == 'male' else -161)
+    factors = NORM_GOAL_FACTORS.get(user.goal or 'maintenance', NORM_GOAL_FACTORS['maintenance'])
+    value = bmr * user.activity_level * factors[0]
+
+    ratio_index, kcal_per_gram = _NORM_PARTS[norm]
+    if ratio_index is not None:
+        value = value * factors[ratio_index] / kcal_per_gram
+
+    return round(value, 1)
+
+
+def _norm_expression(cls, norm):
+    """Та же формула в виде SQL-выражения (для пересчета норм одним UPDATE)"""
+    bmr = 10 * cls.weight + 6.25 * cls.height - 5 * cls.age + case((cls.gender == 'male', 5), else_=-161)
+    goal = func.coalesce(cls.goal, 'maintenance')
+
+    def goal_factor(index):
+        return case(
+            {goal_name: factors[index] for goal_name, factors in NORM_GOAL_FACTORS.items() if goal_name != 'maintenance'},
+            value=goal,
+            else_=NORM_GOAL_FACTORS['maintenance'][index]
+        )
+
+    value = bmr * cls.activity_level * goal_factor(0)
+
+    ratio_index, kcal_per_gram = _NORM_PARTS[norm]
+    if ratio_index is not None:
+        value = value * goal_factor(ratio_index) / kcal_per_gram
+
+    has_profile = and_(
+        cls.gender.isnot(None),
+        cls.age.isnot(None),
+        cls.weight.isnot(None),
+        cls.height.isnot(None),
+        cls.activity_level.isnot(None)
+    )
+    return case((has_profile, cast(func.round(cast(value, Numeric), 1), Float)), else_=None)
+
+
+class User(Base):
+    """Модель пользователя"""
+    __tablename__ = 'users'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False, index=True)  # Изменено на BigInteger
+    username: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # Ограничена длина для PostgreSQL
+    first_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    registration_date: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, index=True)  # Добавлен индекс
+
+    # Поля для дневных норм КБЖУ
+    gender: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)  # 'male' или 'female'
+    age: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    weight: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # в кг
+    height: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # в см
+    activity_level: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # коэффициент активности (1.2 - 1.9)
+    goal: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # 'weight_loss', 'maintenance', 'weight_gain'
+
+    # Расчетные нормы (могут быть заданы вручную или расчитаны)
+    daily_calories: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    daily_proteins: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    daily_fats: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    daily_carbs: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # Отношения: связанные записи удаляет БД (ON DELETE CASCADE), ORM их не загружает
+    subscriptions: Mapped[List["UserSubscription"]] = relationship("UserSubscription", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    food_analyses: Mapped[List["FoodAnalysis"]] = relationship("FoodAnalysis", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Нормы, вычисленные по параметрам профиля (в Python и в SQL)
+    @hybrid_property
+    def computed_daily_calories(self):
+        return _norm_value(self, 'calories')
+
+    @computed_daily_calories.inplace.expression
+    @classmethod
+    def _computed_daily_calories_expression(cls):
+        return _norm_expression(cls, 'calories')
+
+    @hybrid_property
+    def computed_daily_proteins(self):
+        return _norm_value(self, 'proteins')
+
+    @computed_daily_proteins.inplace.expression
+    @classmethod
+    def _computed_daily_proteins_expression(cls):
+        return _norm_expression(cls, 'proteins')
+
+    @hybrid_property
+    def computed_daily_fats(self):
+        return _norm_value(self, 'fats')
+
+    @computed_daily_fats.inplace.expression
+    @classmethod
+    def _computed_daily_fats_expression(cls):
+        return _norm_expression(cls, 'fats')
+
+    @hybrid_property
+    def computed_daily_carbs(self):
+        return _norm_value(self, 'carbs')
+
+    @computed_daily_carbs.inplace.expression
+    @classmethod
+    def _computed_daily_carbs_expression(cls):
+        return _norm_expression(cls, 'carbs')
+
+    def __repr__(self):
+        return f"<User(telegram_id={self.telegram_id}, username={self.username})>"
+
+
+class UserSubscription(Base):
+    """Модель подписки пользователя"""
+    __tablename__ = 'user_subscriptions'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    start_date: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    end_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)  # Часто используется в запросах
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True, index=True)
+    payment_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
+
+    # Отношения
+    user: Mapped["User"] = relationship("User", back_populates="subscriptions")
+
+    # Частичный индекс только по активным подпискам: поиск WHERE is_active AND end_date > now()
+    __table_args__ = (
+        Index('idx_active_subscriptions_partial', 'user_id', 'end_date',
+              postgresql_where=text('is_active'), sqlite_where=text('is_active')),
+    )
+
+    def __repr__(self):
+        return f"<UserSubscription(user_id={self.user_id}, active={self.is_active}, end_date={self.end_date})>"
+
+
+class FoodAnalysis(Base):
+    """Модель анализа пищи"""
+    __tablename__ = 'food_analyses'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    # В PostgreSQL ключ секционирования обязан входить в первичный ключ: PK (id, analysis_date)
+    analysis_date: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=DB_UTC_NOW, primary_key=IS_POSTGRESQL,
+                                                             nullable=not IS_POSTGRESQL, index=True)  # Часто используется в запросах
+    food_name: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # Увеличена длина
+    calories: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    proteins: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    fats: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    carbs: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    image_path: Mapped[Optional[str]] = mapped_column(String(1000), nullable=True)  # Путь к изображению
+    portion_weight: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # Вес порции
+    meal_type: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)  # 'breakfast', 'lunch', 'dinner', 'snack'
+
+    # Отношения
+    user: Mapped["User"] = relationship("User", back_populates="food_analyses")
+
+    # Составные индексы для оптимизации запросов статистики
+    __table_args__ = (
+        # Покрывающий индекс: дневные суммы КБЖУ читаются без обращения к таблице (index-only scan)
+        Index('idx_fa_user_date', 'user_id', 'analysis_date',
+              postgresql_include=['calories', 'proteins', 'fats', 'carbs', 'meal_type']),
+        Index('idx_user_meal_date', 'user_id', 'meal_type', 'analysis_date'),
+        # PostgreSQL: помесячные секции по analysis_date (см. ensure_food_analysis_partitions)
+        {'postgresql_partition_by': 'RANGE (analysis_date)'},
+    )
+
+    def __repr__(self):
+        return f"<FoodAnalysis(id={self.id}, food_name={self.food_name}, calories={self.calories})>"
+
+
+class UserDailyRollup(Base):
+    """Дневные суммы КБЖУ пользователя (агрегат по food_analyses)"""
+    __tablename__ = 'user_daily_rollup'
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    analyses_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    calories: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    proteins: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    fats: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    carbs: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UserDailyRollup(user_id={self.user_id}, day={self.day}, calories={self.calories})>"
+
+
+def create_database_engine():
+    """
+    Создание engine базы данных с оптимальными настройками
+    """
+    try:
+        if IS_POSTGRESQL:
+            if DB_POOL_CLASS == 'null':
+                # Пулом управляет PgBouncer: соединение открывается на каждый checkout
+                pool_args = {"poolclass": NullPool}
+            else:
+                # PostgreSQL с connection pooling
+                pool_args = {
+                    "poolclass": QueuePool,
+                    "pool_size": DB_POOL_SIZE,
+                    "max_overflow": DB_MAX_OVERFLOW,
+                    "pool_timeout": DB_POOL_TIMEOUT,
+                    "pool_recycle": DB_POOL_RECYCLE,
+                }
+
+            engine = create_engine(
+                DATABASE_URL,
+                **pool_args,
+                pool_pre_ping=DB_POOL_PRE_PING,  # Проверка соединений (SELECT 1 на checkout)
+                echo=False,  # Отключаем SQL логи в продакшене
+                future=True,  # Используем новый стиль SQLAlchemy 2.0
+                query_cache_size=DB_QUERY_CACHE_SIZE,  # Кэш скомпилированных select()
+                connect_args={
+                    "application_name": DB_APPLICATION_NAME,
+                    "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+                }
+            )
+            if DB_POOL_CLASS == 'null':
+                logger.info(f"PostgreSQL engine created with NullPool, pre_ping={DB_POOL_PRE_PING}")
+            else:
+                logger.info(f"PostgreSQL engine created with pool_size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW}")
+        else:
+            # SQLite fallback (для разработки)
+            engine = create_engine(
+                DATABASE_URL,
+                pool_timeout=DB_POOL_TIMEOUT,
+                echo=False,
+                future=True,
+                query_cache_size=DB_QUERY_CACHE_SIZE,
+                # SQLite специфичные настройки
+                connect_args={
+                    "check_same_thread": False,
+                    "timeout": 20
+                }
+            )
+
+            # В SQLite внешние ключи (и ON DELETE CASCADE) включаются на каждом соединении
+            @event.listens_for(engine, "connect")
+            def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+
+            logger.info("SQLite engine created (fallback mode)")
+
+        return engine
+
+    except Exception as e:
+        logger.error(f"Failed to create database engine: {str(e)}")
+        raise
+
+
+# Сколько месяцев вперед создавать секции food_analyses
+FOOD_ANALYSES_PARTITIONS_AHEAD = 2
+
+
+def _add_months(day, months):
+    """Первое число месяца, отстоящего от day на months месяцев"""
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def ensure_food_analysis_partitions(engine, months_ahead=FOOD_ANALYSES_PARTITIONS_AHEAD):
+    """
+    Создание помесячных секций food_analyses на текущий и следующие месяцы (только PostgreSQL)
+
+    Секционированной таблица создается только в новой БД; существующая
+    несекционированная таблица остается как есть до ручной миграции.
+    Строки месяца, успевшие попасть в секцию DEFAULT, переносятся в создаваемую секцию
+    """
+    if not IS_POSTGRESQL:
+        return []
+
+    created = []
+
+    with engine.begin() as conn:
+        partitioned = conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('food_analyses')"
+        )).first()
+        if not partitioned:
+            return created
+
+        # Секция по умолчанию для записей вне созданных диапазонов
+        conn.execute(text("CREATE TABLE IF NOT EXISTS food_analyses_default PARTITION OF food_analyses DEFAULT"))
+
+        month_start = _add_months(datetime.utcnow().date(), 0)
+        for offset in range(months_ahead + 1):
+            start = _add_months(month_start, offset)
+            end = _add_months(start, 1)
+            partition_name = f"food_analyses_{start:%Y_%m}"
+            if engine.dialect.has_table(conn, partition_name):
+                continue
+
+            # Пока секция создается, новые строки в DEFAULT не попадают
+            conn.execute(text("LOCK TABLE food_analyses_default IN EXCLUSIVE MODE"))
+            bounds = {'start': start, 'end': end}
+            in_default = conn.execute(text(
+                "SELECT 1 FROM food_analyses_default "
+                "WHERE analysis_date >= :start AND analysis_date < :end LIMIT 1"
+            ), bounds).first()
+
+            if in_default:
+                # PostgreSQL не создает секцию, если в DEFAULT уже есть строки ее диапазона:
+                # переносим их в новую таблицу и присоединяем ее секцией в этой же транзакции
+                conn.execute(text("SET LOCAL statement_timeout = 0"))
+                conn.execute(text(f"CREATE TABLE {partition_name} (LIKE food_analyses INCLUDING DEFAULTS)"))
+                moved = conn.execute(text(
+                    f"WITH moved AS (DELETE FROM food_analyses_default "
+                    f"WHERE analysis_date >= :start AND analysis_date < :end RETURNING *) "
+                    f"INSERT INTO {partition_name} SELECT * FROM moved"
+                ), bounds).rowcount
+                conn.execute(text(
+                    f"ALTER TABLE food_analyses ATTACH PARTITION {partition_name} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+                logger.info(f"Moved {moved} rows from food_analyses_default to {partition_name}")
+            else:
+                conn.execute(text(
+                    f"CREATE TABLE {partition_name} PARTITION OF food_analyses "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+            created.append(partition_name)
+
+    if created:
+        logger.info(f"Created food_analyses partitions: {', '.join(created)}")
+
+    return created
+
+
+def fill_daily_rollup(conn, since=None):
+    """
+    Заполнение user_daily_rollup суммами из food_analyses (INSERT ... SELECT)
+
+    Args:
+        conn: Соединение или сессия SQLAlchemy
+        since (datetime): Учитывать только анализы начиная с этого момента (None - все)
+
+    Returns:
+        int: Число вставленных дневных агрегатов
+    """
+    day_expr = func.date(FoodAnalysis.analysis_date)
+
+    query = select(
+        FoodAnalysis.user_id,
+        day_expr,
+        func.count(FoodAnalysis.id),
+        func.coalesce(func.sum(FoodAnalysis.calories), 0),
+        func.coalesce(func.sum(FoodAnalysis.proteins), 0),
+        func.coalesce(func.sum(FoodAnalysis.fats), 0),
+        func.coalesce(func.sum(FoodAnalysis.carbs), 0)
+    ).group_by(FoodAnalysis.user_id, day_expr)
+    if since is not None:
+        query = query.where(FoodAnalysis.analysis_date >= since)
+
+    result = conn.execute(
+        insert(UserDailyRollup).from_select(
+            ['user_id', 'day', 'analyses_count', 'calories', 'proteins', 'fats', 'carbs'],
+            query
+        )
+    )
+    return result.rowcount
+
+
+# Инициализация базы данных
+def init_db():
+    """
+    Инициализация базы данных с созданием всех таблиц
+    """
+    try:
+        engine = create_database_engine()
+
+        with engine.begin() as conn:
+            rollup_exists = engine.dialect.has_table(conn, UserDailyRollup.__tablename__)
+
+            # Создание всех таблиц
+            Base.metadata.create_all(conn)
+
+            # Таблица агрегатов появилась в уже существующей БД: заполняем ее в той же
+            # транзакции, до первого чтения статистики
+            if not rollup_exists:
+                filled = fill_daily_rollup(conn)
+                logger.info(f"Daily rollup filled from existing analyses: {filled} rows")
+
+        ensure_food_analysis_partitions(engine)
+        logger.info("Database tables created successfully")
+
+        return engine
+
+    except Exception as e:
+        logger.error(f"Database initialization failed: {str(e)}")
+        raise
+
+
+def _sanitized_database_url(url):
+    """URL БД без пароля и адреса сервера: остаются только схема и имя пользователя"""
+    credentials, sep, _ = url.partition('@')
+    if not sep:
+        return 'SQLite file'
+
+    scheme, _, user_info = credentials.rpartition('//')
+    user, has_password, _ = user_info.partition(':')
+    return f"{scheme}//{user}{':***' if has_password else ''}@***"
+
+
+# Конфигурация БД не меняется во время работы процесса - собираем один раз при импорте
+_DB_INFO = {
+    'database_type': 'PostgreSQL' if IS_POSTGRESQL else 'SQLite',
+    'database_url': _sanitized_database_url(DATABASE_URL),
+    'pool_class': DB_POOL_CLASS if IS_POSTGRESQL else 'N/A',
+    'pool_size': DB_POOL_SIZE if IS_POSTGRESQL else 'N/A',
+    'max_overflow': DB_MAX_OVERFLOW if IS_POSTGRESQL else 'N/A',
+    'pool_timeout': DB_POOL_TIMEOUT
+}
+
+
+def get_database_info():
+    """
+    Получение информации о текущей конфигурации базы данных
+    """
+    return _DB_INFO.copy()
\ No newline at end of file
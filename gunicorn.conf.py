@@ -0,0 +1,25 @@
+"""
+Настройки gunicorn для webhook-сервера (run_webhook.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Не "config": имена модуля gunicorn считает своими настройками
+import config as bot_config
+
+# Ровно один процесс-воркер: user_data, next_step-обработчики telebot и очередь обновлений
+# хранятся в памяти процесса, поэтому все обновления должны попадать в один процесс.
+# Параллельность запросов обеспечивают потоки gthread
+bind = f"{bot_config.WEBHOOK_LISTEN}:{bot_config.WEBHOOK_PORT}"
+workers = 1
+worker_class = 'gthread'
+threads = getattr(bot_config, 'WEBHOOK_THREADS', 8)
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+
+def post_worker_init(worker):
+    """Фоновые потоки запускаются в самом воркере: потоки мастер-процесса не переживают fork"""
+    from bot import start_background_maintenance
+    start_background_maintenance()
@@ -1,315 +1,841 @@
-import time
-import logging
-import threading
-import json
-import os
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
-
-logger = logging.getLogger(__name__)
-
-class MetricsCollector:
-    """Коллектор метрик для отслеживания производительности и выявления проблем"""
-    
-    def __init__(self, save_interval=3600, metrics_file='data/metrics.json'):
-        """
-        Инициализация коллектора метрик
-        
-        Args:
-            save_interval (int): Интервал сохранения метрик в секундах (по умолчанию: 1 час)
-            metrics_file (str): Имя файла для сохранения метрик
-        """
-        self.metrics_file = metrics_file
-        self.save_interval = save_interval
-        self.lock = threading.Lock()
-        
-        # Инициализация метрик значениями по умолчанию
-        self._init_default_metrics()
-        
-        # Попытка загрузки существующих метрик из файла
-        self._load_metrics()
-        
-        # Запуск фонового потока для периодического сохранения метрик
-        self._start_background_save()
-
-    def _init_default_metrics(self):
-        """Инициализация метрик значениями по умолчанию"""
-        current_time = datetime.now().isoformat()
-        self.metrics = {
-            'api_calls': defaultdict(int),  # Количество вызовов каждого API
-            'api_errors': defaultdict(int),  # Количество ошибок каждого API
-            'api_response_times': defaultdict(list),  # Время ответа каждого API (последние 100)
-            'photo_analyses': 0,  # Общее количество анализов фотографий
-            'voice_analyses': 0,  # ✅ ДОБАВЛЕНО: Общее количество анализов голоса
-            'text_analyses': 0,  # ✅ ДОБАВЛЕНО: Общее количество анализов текста
-            'barcode_scans': 0,  # Общее количество сканирований штрихкодов
-            'unique_users': set(),  # Уникальные пользователи
-            'user_commands': defaultdict(int),  # Количество выполненных команд
-            'subscription_purchases': 0,  # Количество покупок подписок
-            'errors': defaultdict(int),  # Количество ошибок по типам
-            'start_time': current_time,  # Время запуска коллектора
-            'restart_count': 0,  # Счетчик перезапусков
-            'start_times': [current_time]  # История времен запуска
-        }
-        self.max_response_times = 100  # Хранить только последние 100 значений времени ответа
-        self._last_save = time.time()
-
-    def _load_metrics(self):
-        """Загрузка метрик из файла, если он существует"""
-        try:
-            if os.path.exists(self.metrics_file):
-                with open(self.metrics_file, 'r', encoding='utf-8') as f:
-                    saved_metrics = json.load(f)
-
-                # Обновление метрик из сохраненного файла
-                with self.lock:
-                    # API вызовы
-                    for api, count in saved_metrics.get('api_calls', {}).items():
-                        self.metrics['api_calls'][api] = count
-
-                    # API ошибки
-                    for api, count in saved_metrics.get('api_errors', {}).items():
-                        self.metrics['api_errors'][api] = count
-
-                    # Время ответа API
-                    for api, times in saved_metrics.get('api_response_times', {}).items():
-                        self.metrics['api_response_times'][api] = deque(times, maxlen=self.max_response_times)
-
-                    # Счетчики анализов
-                    self.metrics['photo_analyses'] = saved_metrics.get('photo_analyses', 0)
-                    self.metrics['voice_analyses'] = saved_metrics.get('voice_analyses', 0)  # ✅ ДОБАВЛЕНО
-                    self.metrics['text_analyses'] = saved_metrics.get('text_analyses', 0)  # ✅ ДОБАВЛЕНО
-                    self.metrics['barcode_scans'] = saved_metrics.get('barcode_scans', 0)
-
-                    # Уникальные пользователи - преобразуем обратно в set
-                    if isinstance(saved_metrics.get('unique_users'), int):
-                        # Если сохранено только количество, мы не можем восстановить множество
-                        # Но мы можем отслеживать новых уникальных пользователей
-                        self.metrics['unique_users'] = set()
-                    elif isinstance(saved_metrics.get('unique_users'), list):
-                        # Если у нас есть список, преобразуем его обратно в множество
-                        self.metrics['unique_users'] = set(saved_metrics.get('unique_users', []))
-
-                    # Команды
-                    for cmd, count in saved_metrics.get('user_commands', {}).items():
-                        self.metrics['user_commands'][cmd] = count
-
-                    # Подписки
-                    self.metrics['subscription_purchases'] = saved_metrics.get('subscription_purchases', 0)
-
-                    # Ошибки
-                    for error, count in saved_metrics.get('errors', {}).items():
-                        self.metrics['errors'][error] = count
-
-                    # Обновляем счетчик перезапусков
-                    self.metrics['restart_count'] = saved_metrics.get('restart_count', 0) + 1
-
-                    # Добавляем историю времен запуска
-                    self.metrics['start_times'] = saved_metrics.get('start_times', [])
-                    self.metrics['start_times'].append(datetime.now().isoformat())
-
-                logger.info(f"Метрики успешно загружены из {self.metrics_file}")
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке метрик: {str(e)}")
-    
-    def _start_background_save(self):
-        """Запуск фонового потока для периодического сохранения метрик"""
-        def save_periodically():
-            while True:
-                try:
-                    time.sleep(self.save_interval)
-                    self.save_metrics()
-                except Exception as e:
-                    logger.error(f"Ошибка в потоке сохранения метрик: {str(e)}")
-        
-        save_thread = threading.Thread(target=save_periodically, daemon=True)
-        save_thread.start()
-        logger.info("Фоновый поток для сохранения метрик запущен")
-    
-    def track_api_call(self, api_name, response_time=None, error=False):
-        """
-        Отслеживание вызова API
-        
-        Args:
-            api_name (str): Название API
-            response_time (float, optional): Время ответа в секундах
-            error (bool): Флаг ошибки вызова
-        """
-        with self.lock:
-            self.metrics['api_calls'][api_name] += 1
-            
-            if error:
-                self.metrics['api_errors'][api_name] += 1
-            
-            if response_time is not None:
-                if api_name not in self.metrics['api_response_times']:
-                    self.metrics['api_response_times'][api_name] = deque(maxlen=self.max_response_times)
-                self.metrics['api_response_times'][api_name].append(response_time)
-    
-    def track_photo_analysis(self, user_id):
-        """
-        Отслеживание анализа фотографии
-        
-        Args:
-            user_id (int): ID пользователя
-        """
-        with self.lock:
-            self.metrics['photo_analyses'] += 1
-            self.metrics['unique_users'].add(user_id)
-
-    def track_voice_analysis(self, user_id):
-        """
-        Отслеживание анализа голосового сообщения
-
-        Args:
-            user_id (int): ID пользователя
-        """
-        with self.lock:
-            if 'voice_analyses' not in self.metrics:
-                self.metrics['voice_analyses'] = 0
-            self.metrics['voice_analyses'] += 1
-            self.metrics['unique_users'].add(user_id)
-
-    def track_text_analysis(self, user_id):
-        """
-        Отслеживание анализа текстового сообщения
-
-        Args:
-            user_id (int): ID пользователя
-        """
-        with self.lock:
-            if 'text_analyses' not in self.metrics:
-                self.metrics['text_analyses'] = 0
-            self.metrics['text_analyses'] += 1
-            self.metrics['unique_users'].add(user_id)
-    
-    def track_barcode_scan(self, user_id):
-        """
-        Отслеживание сканирования штрихкода
-        
-        Args:
-            user_id (int): ID пользователя
-        """
-        with self.lock:
-            self.metrics['barcode_scans'] += 1
-            self.metrics['unique_users'].add(user_id)
-    
-    def track_command(self, command):
-        """
-        Отслеживание выполнения команды
-        
-        Args:
-            command (str): Название команды
-        """
-        with self.lock:
-            self.metrics['user_commands'][command] += 1
-    
-    def track_subscription_purchase(self):
-        """Отслеживание покупки подписки"""
-        with self.lock:
-            self.metrics['subscription_purchases'] += 1
-    
-    def track_error(self, error_type):
-        """
-        Отслеживание ошибки
-        
-        Args:
-            error_type (str): Тип ошибки
-        """
-        with self.lock:
-            self.metrics['errors'][error_type] += 1
-
-    def get_metrics_summary(self):
-        """
-        Получение сводки по метрикам
-
-        Returns:
-            dict: Сводка по метрикам
-        """
-        with self.lock:
-            # Расчет метрик
-            total_api_calls = sum(self.metrics['api_calls'].values())
-            total_api_errors = sum(self.metrics['api_errors'].values())
-            error_rate = total_api_errors / total_api_calls if total_api_calls > 0 else 0
-
-            # Среднее время ответа для каждого API
-            avg_response_times = {}
-            for api, times in self.metrics['api_response_times'].items():
-                if times:
-                    avg_response_times[api] = sum(times) / len(times)
-
-            # Расчет времени работы
-            start_time = datetime.fromisoformat(self.metrics['start_time'])
-            uptime_seconds = (datetime.now() - start_time).total_seconds()
-
-            return {
-                'total_api_calls': total_api_calls,
-                'total_api_errors': total_api_errors,
-                'error_rate': f"{error_rate:.2%}",
-                'avg_response_times': avg_response_times,
-                'photo_analyses': self.metrics['photo_analyses'],
-                'voice_analyses': self.metrics.get('voice_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
-                'text_analyses': self.metrics.get('text_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
-                'barcode_scans': self.metrics['barcode_scans'],
-                'unique_users_count': len(self.metrics['unique_users']),
-                'popular_commands': dict(sorted(
-                    self.metrics['user_commands'].items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )[:5]),  # топ-5 команд
-                'subscription_purchases': self.metrics['subscription_purchases'],
-                'top_errors': dict(sorted(
-                    self.metrics['errors'].items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )[:5]),  # топ-5 ошибок
-                'uptime': f"{uptime_seconds / 3600:.1f} часов",
-                'restart_count': self.metrics.get('restart_count', 0),
-                'start_times': self.metrics.get('start_times', [])
-            }
-
-    def save_metrics(self):
-        """Сохранение метрик в файл"""
-        try:
-            with self.lock:
-                # Создание копии метрик для сериализации
-                serializable_metrics = {
-                    'api_calls': dict(self.metrics['api_calls']),
-                    'api_errors': dict(self.metrics['api_errors']),
-                    'api_response_times': {k: list(v) for k, v in self.metrics['api_response_times'].items()},
-                    'photo_analyses': self.metrics['photo_analyses'],
-                    'voice_analyses': self.metrics.get('voice_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
-                    'text_analyses': self.metrics.get('text_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
-                    'barcode_scans': self.metrics['barcode_scans'],
-                    # Сохраняем как список для возможности восстановления
-                    'unique_users': list(self.metrics['unique_users']) if isinstance(self.metrics['unique_users'],
-                                                                                     set) else [],
-                    'user_commands': dict(self.metrics['user_commands']),
-                    'subscription_purchases': self.metrics['subscription_purchases'],
-                    'errors': dict(self.metrics['errors']),
-                    'start_time': self.metrics['start_time'],
-                    'restart_count': self.metrics.get('restart_count', 0),
-                    'start_times': self.metrics.get('start_times', []),
-                    'save_time': datetime.now().isoformat()
-                }
-
-                # Создание директории для метрик, если она не существует
-                directory = os.path.dirname(self.metrics_file)
-                if directory:
-                    os.makedirs(directory, exist_ok=True)
-
-                # Сохранение метрик в файл
-                with open(self.metrics_file, 'w', encoding='utf-8') as f:
-                    json.dump(serializable_metrics, f, ensure_ascii=False, indent=2)
-
-                logger.info(f"Метрики успешно сохранены в {self.metrics_file}")
-                self._last_save = time.time()
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении метрик: {str(e)}")
-
-
-# Создание глобального экземпляра коллектора метрик
-metrics_collector = MetricsCollector(
-    save_interval=3600,  # Сохранять метрики каждый час
-    metrics_file='data/metrics.json'
+import time
+import logging
+import threading
+import atexit
+import os
+import math
+import heapq
+import base64
+import hashlib
+import itertools
+from array import array
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict, deque
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class CounterTable:
+    """
+    Именованные счетчики в раздельном хранении: имя -> индекс и массив значений array('Q')
+
+    Сумма всех счетчиков ведется инкрементально, total() не обходит массив
+    """
+
+    __slots__ = ('_ids', '_names', '_counts', '_total')
+
+    def __init__(self, values=None):
+        self._ids = {}
+        self._names = []
+        self._counts = array('Q')
+        self._total = 0
+        for name, count in (values or {}).items():
+            self.add(name, count)
+
+    def add(self, name, count=1):
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._counts.append(0)
+        self._counts[i] += count
+        self._total += count
+
+    def __getitem__(self, name):
+        i = self._ids.get(name)
+        return 0 if i is None else self._counts[i]
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def items(self):
+        return zip(self._names, self._counts)
+
+    def total(self):
+        return self._total
+
+    def top(self, k):
+        """k самых больших счетчиков по убыванию (частичная выборка без полной сортировки)"""
+        indexes = heapq.nlargest(k, range(len(self._counts)), key=self._counts.__getitem__)
+        return [(self._names[i], self._counts[i]) for i in indexes]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def trim(self, max_keys, new_names=()):
+        """
+        Оставляет не более max_keys имен, вытесняя счетчики с наименьшими значениями
+
+        Имена из new_names (впервые добавленные с прошлого вызова) вытесняются в последнюю очередь:
+        иначе только что пришедшее имя с малым счетчиком вытеснялось бы сразу же. Счетчики
+        оставшихся имен не меняются - в сводке только реально накопленные значения
+        """
+        excess = len(self._names) - max_keys
+        if excess <= 0:
+            return
+
+        counts = self._counts
+        new_ids = {self._ids[name] for name in new_names if name in self._ids}
+        evicted = set(heapq.nsmallest(excess, range(len(counts)), key=lambda i: (i in new_ids, counts[i])))
+        kept = [i for i in range(len(self._names)) if i not in evicted]
+
+        self._total -= sum(counts[i] for i in evicted)
+        self._names = [self._names[i] for i in kept]
+        self._counts = array('Q', (self._counts[i] for i in kept))
+        self._ids = {name: i for i, name in enumerate(self._names)}
+
+    def copy(self):
+        table = CounterTable()
+        table._ids = self._ids.copy()
+        table._names = self._names[:]
+        table._counts = self._counts[:]
+        table._total = self._total
+        return table
+
+
+class HyperLogLog:
+    """
+    Оценка количества уникальных значений (HyperLogLog) в фиксированной памяти
+
+    2 ** precision однобайтовых регистров; при precision=12 - 4 КБ и погрешность ~1.6%
+    """
+
+    __slots__ = ('precision', '_m', '_registers')
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self._m = 1 << precision
+        self._registers = bytearray(registers) if registers is not None else bytearray(self._m)
+
+    @staticmethod
+    def _hash(value):
+        """64-битный хеш: splitmix64 для целых, blake2b для остальных значений"""
+        if isinstance(value, int):
+            z = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+            z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+            z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+            return z ^ (z >> 31)
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value):
+        x = self._hash(value)
+        index = x >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rank = rest_bits - (x & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Объединение с другим скетчем той же точности (поэлементный максимум регистров)"""
+        if other.precision != self.precision:
+            raise ValueError("HyperLogLog precision mismatch")
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def is_empty(self):
+        return not any(self._registers)
+
+    def __len__(self):
+        return int(round(self.count()))
+
+    def count(self):
+        m = self._m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+
+        # Поправка для малых значений (linear counting)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return estimate
+
+    def copy(self):
+        return HyperLogLog(self.precision, self._registers)
+
+    def serialize(self):
+        return base64.b64encode(bytes(self._registers)).decode('ascii')
+
+    @classmethod
+    def deserialize(cls, data, precision=12):
+        registers = base64.b64decode(data)
+        if len(registers) != 1 << precision:
+            raise ValueError("HyperLogLog registers size mismatch")
+        return cls(precision, registers)
+
+    def to_sparse(self):
+        """Только ненулевые регистры {индекс: значение} - компактно для скетча с небольшим числом значений"""
+        return {i: r for i, r in enumerate(self._registers) if r}
+
+    @classmethod
+    def from_sparse(cls, registers, precision=12):
+        hll = cls(precision)
+        for index, rank in registers.items():
+            hll._registers[int(index)] = rank
+        return hll
+
+
+class ResponseTimeBuffer:
+    """Кольцевой буфер последних значений времени ответа (непрерывный массив double)"""
+
+    __slots__ = ('_buf', '_size', '_idx', '_count')
+
+    def __init__(self, size, values=()):
+        self._buf = array('d', bytes(8 * size))
+        self._size = size
+        self._idx = 0
+        self._count = 0
+        self.extend(values)
+
+    def append(self, value):
+        self._buf[self._idx] = value
+        self._idx = (self._idx + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return self._count
+
+    def mean(self):
+        if not self._count:
+            return 0.0
+        if self._count < self._size:
+            return sum(self._buf[:self._count]) / self._count
+        return sum(self._buf) / self._count
+
+    def tolist(self):
+        """Значения от старых к новым"""
+        if self._count < self._size:
+            return self._buf[:self._count].tolist()
+        return (self._buf[self._idx:] + self._buf[:self._idx]).tolist()
+
+
+class _ThreadMetrics:
+    """Счетчики одной секции потоков, сливаемые в общие метрики при сохранении/сводке"""
+
+    # Скалярные счетчики, которые ведутся в потоке
+    COUNTERS = ('photo_analyses', 'voice_analyses', 'text_analyses', 'barcode_scans', 'subscription_purchases')
+
+    def __init__(self, max_response_times):
+        # Блокировка почти всегда свободна: секцию делят немногие потоки, плюс слияние
+        self.lock = threading.Lock()
+        self.max_response_times = max_response_times
+        self._reset()
+
+    def _reset(self):
+        self.api_calls = defaultdict(int)
+        self.api_errors = defaultdict(int)
+        self.api_response_times = defaultdict(lambda: deque(maxlen=self.max_response_times))
+        self.user_commands = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.unique_users = set()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def drain(self):
+        """Забирает накопленные значения и обнуляет счетчики секции"""
+        with self.lock:
+            snapshot = (self.api_calls, self.api_errors, self.api_response_times,
+                        self.user_commands, self.errors, self.unique_users, self.counters)
+            self._reset()
+        return snapshot
+
+
+class _MetricsDelta:
+    """Приращения метрик между сохранениями - одна запись журнала метрик"""
+
+    def __init__(self, max_response_times):
+        self.api_calls = defaultdict(int)
+        self.api_errors = defaultdict(int)
+        self.api_response_times = defaultdict(lambda: deque(maxlen=max_response_times))
+        self.user_commands = defaultdict(int)
+        self.errors = defaultdict(int)
+        # В журнал попадают только регистры HyperLogLog, а не ID пользователей
+        self.unique_users = HyperLogLog()
+        self.counters = dict.fromkeys(_ThreadMetrics.COUNTERS, 0)
+
+    def add(self, api_calls, api_errors, response_times, user_commands, errors, users, counters):
+        """
+        Добавляет значения, снятые со счетчиков потока (_ThreadMetrics.drain) или из журнала
+
+        users - ID пользователей или HyperLogLog из записи журнала
+        """
+        for api, count in api_calls.items():
+            self.api_calls[api] += count
+        for api, count in api_errors.items():
+            self.api_errors[api] += count
+        for api, times in response_times.items():
+            self.api_response_times[api].extend(times)
+        for cmd, count in user_commands.items():
+            self.user_commands[cmd] += count
+        for error, count in errors.items():
+            self.errors[error] += count
+        if isinstance(users, HyperLogLog):
+            self.unique_users.merge(users)
+        else:
+            self.unique_users.update(users)
+        for name, count in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def parts(self):
+        return (self.api_calls, self.api_errors, self.api_response_times,
+                self.user_commands, self.errors, self.unique_users, self.counters)
+
+    def is_empty(self):
+        return not (self.api_calls or self.api_errors or self.user_commands or self.errors
+                    or not self.unique_users.is_empty() or any(self.counters.values()))
+
+    def to_record(self, seq):
+        return {
+            'seq': seq,
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+            'api_response_times': {api: list(times) for api, times in self.api_response_times.items()},
+            'user_commands': self.user_commands,
+            'errors': self.errors,
+            'unique_users': self.unique_users.to_sparse(),
+            'counters': self.counters,
+        }
+
+    @classmethod
+    def from_record(cls, record, max_response_times):
+        users = record.get('unique_users', [])
+        if isinstance(users, dict):
+            users = HyperLogLog.from_sparse(users)
+        # Список - старый формат записи с ID пользователей
+
+        delta = cls(max_response_times)
+        delta.add(record.get('api_calls', {}), record.get('api_errors', {}),
+                  record.get('api_response_times', {}), record.get('user_commands', {}),
+                  record.get('errors', {}), users, record.get('counters', {}))
+        return delta
+
+
+class MetricsCollector:
+    """Коллектор метрик для отслеживания производительности и выявления проблем"""
+
+    # Размер журнала, после которого следующее сохранение пишет полный снимок
+    MAX_JOURNAL_BYTES = 1024 * 1024
+
+    # Сколько последних времен запуска хранить
+    MAX_START_TIMES = 50
+    # Предел числа разных имен в счетчиках ошибок и команд
+    MAX_UNIQUE_KEYS = 256
+    # Число секций счетчиков потоков. Под gevent каждый гринлет - отдельный "поток",
+    # поэтому счетчики не заводятся на каждый поток, а распределяются по фиксированным секциям
+    THREAD_METRICS_SHARDS = 16
+    
+    def __init__(self, save_interval=3600, metrics_file='data/metrics.json'):
+        """
+        Инициализация коллектора метрик
+        
+        Args:
+            save_interval (int): Интервал сохранения метрик в секундах (по умолчанию: 1 час)
+            metrics_file (str): Имя файла для сохранения метрик
+        """
+        self.metrics_file = metrics_file
+        # Журнал приращений: между снимками сохранение дописывает одну строку
+        self.journal_file = metrics_file + '.log'
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        # Блокировка сохранения: упорядочивает записи в файлы, сериализация идет вне self.lock
+        self._save_lock = threading.Lock()
+        # Номер последней записи журнала и его текущий размер
+        self._journal_seq = 0
+        self._journal_size = 0
+
+        # Инициализация метрик значениями по умолчанию
+        self._init_default_metrics()
+
+        # Секции счетчиков: track_* пишут в секцию своего потока без общей блокировки.
+        # Поток (гринлет) получает секцию по кругу при первом обращении
+        self._local = threading.local()
+        self._thread_metrics = [_ThreadMetrics(self.max_response_times) for _ in range(self.THREAD_METRICS_SHARDS)]
+        self._next_shard = itertools.count()
+        
+        # Попытка загрузки существующих метрик из файла
+        self._load_metrics()
+        
+        # Запуск фонового потока для периодического сохранения метрик
+        self._start_background_save()
+
+    def _init_default_metrics(self):
+        """Инициализация метрик значениями по умолчанию"""
+        # Время работы считается по монотонным часам; ISO-строка нужна только для файла
+        self._start_ns = time.monotonic_ns()
+        current_time = datetime.now().isoformat()
+        self.metrics = {
+            'api_calls': CounterTable(),  # Количество вызовов каждого API
+            'api_errors': CounterTable(),  # Количество ошибок каждого API
+            'api_response_times': {},  # Время ответа каждого API (кольцевые буферы последних 100)
+            'photo_analyses': 0,  # Общее количество анализов фотографий
+            'voice_analyses': 0,  # ✅ ДОБАВЛЕНО: Общее количество анализов голоса
+            'text_analyses': 0,  # ✅ ДОБАВЛЕНО: Общее количество анализов текста
+            'barcode_scans': 0,  # Общее количество сканирований штрихкодов
+            'unique_users': HyperLogLog(),  # Оценка числа уникальных пользователей
+            'user_commands': CounterTable(),  # Количество выполненных команд
+            'subscription_purchases': 0,  # Количество покупок подписок
+            'errors': CounterTable(),  # Количество ошибок по типам
+            'start_time': current_time,  # Время запуска коллектора
+            'restart_count': 0,  # Счетчик перезапусков
+            'start_times': [current_time]  # История времен запуска
+        }
+        self.max_response_times = 100  # Хранить только последние 100 значений времени ответа
+        self._last_save = time.time()
+        # Приращения с последнего сохранения; после запуска или сброса нужен полный снимок
+        self._pending = _MetricsDelta(self.max_response_times)
+        self._needs_snapshot = True
+
+    def _load_metrics(self):
+        """Загрузка метрик из файла, если он существует"""
+        try:
+            if os.path.exists(self.metrics_file):
+                with open(self.metrics_file, 'rb') as f:
+                    saved_metrics = orjson.loads(f.read())
+
+                # Обновление метрик из сохраненного файла
+                with self.lock:
+                    # API вызовы
+                    self.metrics['api_calls'] = CounterTable(saved_metrics.get('api_calls'))
+
+                    # API ошибки
+                    self.metrics['api_errors'] = CounterTable(saved_metrics.get('api_errors'))
+
+                    # Время ответа API
+                    for api, times in saved_metrics.get('api_response_times', {}).items():
+                        self.metrics['api_response_times'][api] = ResponseTimeBuffer(self.max_response_times, times)
+
+                    # Счетчики анализов
+                    self.metrics['photo_analyses'] = saved_metrics.get('photo_analyses', 0)
+                    self.metrics['voice_analyses'] = saved_metrics.get('voice_analyses', 0)  # ✅ ДОБАВЛЕНО
+                    self.metrics['text_analyses'] = saved_metrics.get('text_analyses', 0)  # ✅ ДОБАВЛЕНО
+                    self.metrics['barcode_scans'] = saved_metrics.get('barcode_scans', 0)
+
+                    # Уникальные пользователи
+                    saved_users = saved_metrics.get('unique_users')
+                    if isinstance(saved_users, str):
+                        # Сохраненные регистры HyperLogLog
+                        self.metrics['unique_users'] = HyperLogLog.deserialize(saved_users)
+                    elif isinstance(saved_users, list):
+                        # Старый формат: список ID пользователей
+                        self.metrics['unique_users'].update(saved_users)
+                    # Если сохранено только количество, восстановить его нельзя -
+                    # отслеживаем новых уникальных пользователей
+
+                    # Команды
+                    self.metrics['user_commands'] = CounterTable(saved_metrics.get('user_commands'))
+                    self.metrics['user_commands'].trim(self.MAX_UNIQUE_KEYS)
+
+                    # Подписки
+                    self.metrics['subscription_purchases'] = saved_metrics.get('subscription_purchases', 0)
+
+                    # Ошибки
+                    self.metrics['errors'] = CounterTable(saved_metrics.get('errors'))
+                    self.metrics['errors'].trim(self.MAX_UNIQUE_KEYS)
+
+                    # Обновляем счетчик перезапусков
+                    self.metrics['restart_count'] = saved_metrics.get('restart_count', 0) + 1
+
+                    # Добавляем историю времен запуска
+                    self.metrics['start_times'] = saved_metrics.get('start_times', [])[-(self.MAX_START_TIMES - 1):]
+                    self.metrics['start_times'].append(datetime.now().isoformat())
+
+                    self._journal_seq = saved_metrics.get('journal_seq', 0)
+
+                logger.info(f"Метрики успешно загружены из {self.metrics_file}")
+
+            self._replay_journal()
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке метрик: {str(e)}")
+
+    def _replay_journal(self):
+        """Применение записей журнала, сделанных после последнего снимка"""
+        if not os.path.exists(self.journal_file):
+            return
+
+        replayed = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # Недописанная последняя строка (процесс остановлен во время записи)
+                    break
+
+                # Записи до снимка уже учтены в нем
+                if record.get('seq', 0) <= self._journal_seq:
+                    continue
+
+                with self.lock:
+                    self._apply_delta(_MetricsDelta.from_record(record, self.max_response_times))
+                self._journal_seq = record['seq']
+                replayed += 1
+
+        self._journal_size = os.path.getsize(self.journal_file)
+        if replayed:
+            logger.info(f"Применено {replayed} записей журнала метрик {self.journal_file}")
+    
+    def _start_background_save(self):
+        """Запуск фонового потока для периодического сохранения метрик"""
+        self._stop = threading.Event()
+
+        def save_periodically():
+            # wait() сразу возвращает True при остановке, без ожидания полного интервала
+            while not self._stop.wait(self.save_interval):
+                try:
+                    # Пропускаем плановое сохранение, если недавно сохраняли вручную
+                    if time.time() - self._last_save < self.save_interval / 2:
+                        continue
+                    self.save_metrics()
+                except Exception as e:
+                    logger.error(f"Ошибка в потоке сохранения метрик: {str(e)}")
+
+        self._save_thread = threading.Thread(target=save_periodically, daemon=True)
+        self._save_thread.start()
+        # Финальное сохранение при завершении процесса
+        atexit.register(self.close)
+        logger.info("Фоновый поток для сохранения метрик запущен")
+
+    def close(self):
+        """Остановка фонового сохранения и финальная запись метрик"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._save_thread.join(timeout=5)
+        self.save_metrics()
+
+    def _get_thread_metrics(self):
+        """Возвращает секцию счетчиков текущего потока, назначая ее при первом обращении"""
+        local = getattr(self._local, 'metrics', None)
+        if local is None:
+            # next() у itertools.count атомарен под GIL
+            local = self._thread_metrics[next(self._next_shard) % len(self._thread_metrics)]
+            self._local.metrics = local
+        return local
+
+    def _merge_thread_metrics(self):
+        """
+        Сливает счетчики всех потоков в общие метрики (вызывается под self.lock)
+
+        Слитые значения также накапливаются в приращениях для журнала
+        """
+        delta = _MetricsDelta(self.max_response_times)
+        for local in self._thread_metrics:
+            drained = local.drain()
+            delta.add(*drained)
+            self._pending.add(*drained)
+
+        self._apply_delta(delta)
+
+    def _apply_delta(self, delta):
+        """Добавляет приращения к общим метрикам (вызывается под self.lock)"""
+        api_calls, api_errors, response_times, commands, errors, users, counters = delta.parts()
+
+        for api, count in api_calls.items():
+            self.metrics['api_calls'].add(api, count)
+        for api, count in api_errors.items():
+            self.metrics['api_errors'].add(api, count)
+        for api, times in response_times.items():
+            if api not in self.metrics['api_response_times']:
+                self.metrics['api_response_times'][api] = ResponseTimeBuffer(self.max_response_times)
+            self.metrics['api_response_times'][api].extend(times)
+        # Имена, которых еще нет в счетчиках: при ограничении числа имен они не вытесняются первыми
+        new_commands = [cmd for cmd in commands if cmd not in self.metrics['user_commands']]
+        new_errors = [error for error in errors if error not in self.metrics['errors']]
+
+        for cmd, count in commands.items():
+            self.metrics['user_commands'].add(cmd, count)
+        for error, count in errors.items():
+            self.metrics['errors'].add(error, count)
+        self.metrics['unique_users'].merge(users)
+        for name, count in counters.items():
+            self.metrics[name] = self.metrics.get(name, 0) + count
+
+        # Ограничиваем пространство имен (например, track_error(str(exc)) с меняющимся текстом)
+        self.metrics['user_commands'].trim(self.MAX_UNIQUE_KEYS, new_commands)
+        self.metrics['errors'].trim(self.MAX_UNIQUE_KEYS, new_errors)
+
+    def reset(self):
+        """Сброс всех метрик, включая еще не слитые счетчики потоков"""
+        with self.lock:
+            self._merge_thread_metrics()
+            self._init_default_metrics()
+
+    def track_api_call(self, api_name, response_time=None, error=False):
+        """
+        Отслеживание вызова API
+        
+        Args:
+            api_name (str): Название API
+            response_time (float, optional): Время ответа в секундах
+            error (bool): Флаг ошибки вызова
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.api_calls[api_name] += 1
+            
+            if error:
+                local.api_errors[api_name] += 1
+            
+            if response_time is not None:
+                local.api_response_times[api_name].append(response_time)
+    
+    def track_photo_analysis(self, user_id):
+        """
+        Отслеживание анализа фотографии
+        
+        Args:
+            user_id (int): ID пользователя
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.counters['photo_analyses'] += 1
+            local.unique_users.add(user_id)
+
+    def track_voice_analysis(self, user_id):
+        """
+        Отслеживание анализа голосового сообщения
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.counters['voice_analyses'] += 1
+            local.unique_users.add(user_id)
+
+    def track_text_analysis(self, user_id):
+        """
+        Отслеживание анализа текстового сообщения
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.counters['text_analyses'] += 1
+            local.unique_users.add(user_id)
+    
+    def track_barcode_scan(self, user_id):
+        """
+        Отслеживание сканирования штрихкода
+        
+        Args:
+            user_id (int): ID пользователя
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.counters['barcode_scans'] += 1
+            local.unique_users.add(user_id)
+    
+    def track_command(self, command):
+        """
+        Отслеживание выполнения команды
+        
+        Args:
+            command (str): Название команды
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.user_commands[command] += 1
+    
+    def track_subscription_purchase(self):
+        """Отслеживание покупки подписки"""
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.counters['subscription_purchases'] += 1
+    
+    def track_error(self, error_type):
+        """
+        Отслеживание ошибки
+        
+        Args:
+            error_type (str): Тип ошибки
+        """
+        local = self._get_thread_metrics()
+        with local.lock:
+            local.errors[error_type] += 1
+
+    # Типы событий track_batch и соответствующие счетчики потока
+    BATCH_EVENT_COUNTERS = {
+        'api_call': 'api_calls',
+        'api_error': 'api_errors',
+        'command': 'user_commands',
+        'error': 'errors',
+    }
+
+    def track_batch(self, events):
+        """
+        Пакетное отслеживание нескольких событий одного запроса за одну блокировку
+
+        Args:
+            events (list): Пары (тип события, имя), тип - 'api_call', 'api_error', 'command' или 'error'
+        """
+        counts = Counter(events)
+        unknown = {kind for kind, _ in counts} - self.BATCH_EVENT_COUNTERS.keys()
+        if unknown:
+            raise ValueError(f"Unknown metric event types: {', '.join(sorted(unknown))}")
+
+        local = self._get_thread_metrics()
+        with local.lock:
+            for (kind, name), count in counts.items():
+                getattr(local, self.BATCH_EVENT_COUNTERS[kind])[name] += count
+
+    def get_metrics_summary(self):
+        """
+        Получение сводки по метрикам
+
+        Returns:
+            dict: Сводка по метрикам
+        """
+        with self.lock:
+            self._merge_thread_metrics()
+
+            # Расчет метрик
+            total_api_calls = self.metrics['api_calls'].total()
+            total_api_errors = self.metrics['api_errors'].total()
+            error_rate = total_api_errors / total_api_calls if total_api_calls > 0 else 0
+
+            # Среднее время ответа для каждого API
+            avg_response_times = {}
+            for api, times in self.metrics['api_response_times'].items():
+                if len(times):
+                    avg_response_times[api] = times.mean()
+
+            # Расчет времени работы
+            uptime_seconds = (time.monotonic_ns() - self._start_ns) / 1e9
+
+            return {
+                'total_api_calls': total_api_calls,
+                'total_api_errors': total_api_errors,
+                'error_rate': f"{error_rate:.2%}",
+                'avg_response_times': avg_response_times,
+                'photo_analyses': self.metrics['photo_analyses'],
+                'voice_analyses': self.metrics.get('voice_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
+                'text_analyses': self.metrics.get('text_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
+                'barcode_scans': self.metrics['barcode_scans'],
+                'unique_users_count': len(self.metrics['unique_users']),
+                'popular_commands': dict(self.metrics['user_commands'].top(5)),  # топ-5 команд
+                'subscription_purchases': self.metrics['subscription_purchases'],
+                'top_errors': dict(self.metrics['errors'].top(5)),  # топ-5 ошибок
+                'uptime': f"{uptime_seconds / 3600:.1f} часов",
+                'restart_count': self.metrics.get('restart_count', 0),
+                'start_times': self.metrics.get('start_times', [])
+            }
+
+    def save_metrics(self):
+        """
+        Сохранение метрик: строка приращений в журнал или, при необходимости, полный снимок
+
+        Полный снимок пишется после запуска/сброса и когда журнал превышает
+        MAX_JOURNAL_BYTES; после снимка журнал очищается
+        """
+        try:
+            with self._save_lock:
+                # Под блокировкой метрик - только слияние и поверхностные копии
+                with self.lock:
+                    self._merge_thread_metrics()
+                    pending = self._pending
+                    self._pending = _MetricsDelta(self.max_response_times)
+
+                    compact = self._needs_snapshot or self._journal_size >= self.MAX_JOURNAL_BYTES
+                    self._needs_snapshot = False
+
+                    if not compact and pending.is_empty():
+                        self._last_save = time.time()
+                        return
+
+                    self._journal_seq += 1
+                    seq = self._journal_seq
+
+                    if compact:
+                        snapshot = self._snapshot()
+
+                try:
+                    if compact:
+                        self._write_snapshot(snapshot, seq)
+                    else:
+                        self._append_journal(pending, seq)
+                except Exception:
+                    # Приращения не записаны - следующее сохранение пишет полный снимок
+                    self._needs_snapshot = True
+                    raise
+
+            logger.info(f"Метрики успешно сохранены в {self.metrics_file if compact else self.journal_file}")
+            self._last_save = time.time()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении метрик: {str(e)}")
+
+    def _snapshot(self):
+        """Поверхностная копия всех метрик (вызывается под self.lock)"""
+        return {
+            'api_calls': self.metrics['api_calls'].copy(),
+            'api_errors': self.metrics['api_errors'].copy(),
+            'api_response_times': {k: v.tolist() for k, v in self.metrics['api_response_times'].items()},
+            'photo_analyses': self.metrics['photo_analyses'],
+            'voice_analyses': self.metrics.get('voice_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
+            'text_analyses': self.metrics.get('text_analyses', 0),  # ✅ ДОБАВЛЕНО с get() для совместимости
+            'barcode_scans': self.metrics['barcode_scans'],
+            'unique_users': self.metrics['unique_users'].copy(),
+            'user_commands': self.metrics['user_commands'].copy(),
+            'subscription_purchases': self.metrics['subscription_purchases'],
+            'errors': self.metrics['errors'].copy(),
+            'start_time': self.metrics['start_time'],
+            'restart_count': self.metrics.get('restart_count', 0),
+            'start_times': list(self.metrics.get('start_times', [])),
+        }
+
+    def _write_snapshot(self, snapshot, seq):
+        """Запись полного снимка (атомарная замена файла) и очистка журнала"""
+        serializable_metrics = dict(snapshot)
+        for key in ('api_calls', 'api_errors', 'user_commands', 'errors'):
+            serializable_metrics[key] = snapshot[key].to_dict()
+        # Сохраняем регистры HyperLogLog (фиксированный размер)
+        serializable_metrics['unique_users'] = snapshot['unique_users'].serialize()
+        serializable_metrics['save_time'] = datetime.now().isoformat()
+        # Записи журнала с номером не больше этого уже учтены в снимке
+        serializable_metrics['journal_seq'] = seq
+        data = orjson.dumps(serializable_metrics, option=orjson.OPT_NON_STR_KEYS)
+
+        # Создание директории для метрик, если она не существует
+        directory = os.path.dirname(self.metrics_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Сохранение метрик во временный файл и атомарная замена,
+        # чтобы прерванная запись не испортила историю метрик
+        tmp_file = self.metrics_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self.metrics_file)
+
+        # Если процесс остановится до очистки, старые записи пропустятся по journal_seq
+        with open(self.journal_file, 'wb'):
+            pass
+        self._journal_size = 0
+
+    def _append_journal(self, pending, seq):
+        """Дописывает приращения одной строкой в конец журнала"""
+        line = orjson.dumps(pending.to_record(seq), option=orjson.OPT_NON_STR_KEYS) + b'\n'
+        with open(self.journal_file, 'ab') as f:
+            f.write(line)
+        self._journal_size += len(line)
+
+
+# Создание глобального экземпляра коллектора метрик
+metrics_collector = MetricsCollector(
+    save_interval=3600,  # Сохранять метрики каждый час
+    metrics_file='data/metrics.json'
 )
\ No newline at end of file
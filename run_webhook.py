@@ -3,14 +3,21 @@ import os
 import sys
 import logging
 import logging.handlers
-from telebot import apihelper
+import atexit
 import telebot
+import orjson
+from flask import Flask, request, abort, Response, send_from_directory
+from werkzeug.exceptions import HTTPException
 import threading
 import time
-import gc
-import psutil
-from bot import cleanup_user_data, user_data
-from bot import start_cleanup
+import re
+import html
+import gzip
+import zlib
+import hashlib
+import secrets
+import queue
+import traceback
 
 # Добавляем текущую директорию в PYTHONPATH
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,10 +26,11 @@ sys.path.append(script_dir)
 # Импортируем конфигурацию и бота
 from config import (
     TELEGRAM_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PORT,
-    WEBHOOK_HOST, WEBHOOK_LISTEN, WEBHOOK_SSL_CERT, WEBHOOK_SSL_PRIV,
-    LOG_FILE
+    WEBHOOK_LISTEN, WEBHOOK_SSL_CERT, LOG_FILE
 )
+import config
 from bot import bot, logger
+from database.db_manager import DatabaseManager
 
 # Настройка дополнительного логирования для отладки
 file_handler = logging.handlers.RotatingFileHandler(
@@ -30,52 +38,50 @@ file_handler = logging.handlers.RotatingFileHandler(
 )
 file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
+
+# Запись в файл выполняет поток QueueListener: в обработчиках запросов логирование - только put в очередь
+log_queue = queue.Queue(-1)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger.addHandler(queue_handler)
 
 telebot_logger = logging.getLogger('telebot')
 telebot_logger.setLevel(logging.INFO)
-telebot_logger.addHandler(file_handler)
+telebot_logger.addHandler(queue_handler)
 
 
-def main():
-    # Удаляем текущий вебхук, если есть
-    logger.info("Удаление текущего вебхука...")
-    bot.remove_webhook()
+# Поле шаблона: {имя} без пробелов (фигурные скобки CSS/JS под шаблон не подпадают)
+_TEMPLATE_FIELD_RE = re.compile(r'\{(\w+)\}')
 
-    # Параметры для webhook
-    webhook_url = f"{WEBHOOK_URL}/{TELEGRAM_BOT_TOKEN}/"
-    logger.info(f"Настройка вебхука на {webhook_url}")
-
-    # Устанавливаем вебхук
-    bot.set_webhook(
-        url=webhook_url,
-        certificate=open(WEBHOOK_SSL_CERT, 'rb') if WEBHOOK_SSL_CERT else None
-    )
 
-    # Создаем Flask-приложение для обработки webhook
-    from flask import Flask, request, abort
+def _compile_template(template):
+    """
+    Разбивает HTML-шаблон по полям {name} на неизменяемые части в bytes
 
-    app = Flask(__name__)
+    Returns:
+        tuple: (части, имена полей между ними)
+    """
+    pieces = _TEMPLATE_FIELD_RE.split(template)
+    parts = tuple(piece.encode('utf-8') for piece in pieces[::2])
+    fields = tuple(pieces[1::2])
+    return parts, fields
 
-    @app.route('/', methods=['GET'])
-    def home():
-        """Красивая главная страница SnapEat"""
-        try:
-            # Получаем актуальную статистику из БД
-            from database.db_manager import DatabaseManager
-            health = DatabaseManager.get_database_health()
 
-            # Используем реальные данные или дефолтные
-            total_users = health.get('total_users', 9)
-            total_analyses = health.get('total_analyses', 150)
+def _render_template(compiled, **values):
+    """Склеивает готовые части шаблона с закодированными значениями полей"""
+    parts, fields = compiled
+    chunks = [parts[0]]
+    for field, part in zip(fields, parts[1:]):
+        chunks.append(str(values[field]).encode('utf-8'))
+        chunks.append(part)
+    return b''.join(chunks)
 
-        except Exception as e:
-            logger.error(f"Ошибка получения статистики: {str(e)}")
-            # Fallback значения
-            total_users = 9
-            total_analyses = 150
 
-        return f'''<!DOCTYPE html>
+# Главная страница: статичный HTML с полями статистики и версии статики, кодируется один раз при загрузке
+_HOME_PARTS = _compile_template('''<!DOCTYPE html>
 <html lang="ru">
 <head>
     <meta charset="utf-8">
@@ -83,383 +89,7 @@ def main():
     <title>SnapEat - AI анализ питания | Telegram бот для расчета КБЖУ</title>
     <meta name="description" content="SnapEat - революционный Telegram бот с ИИ для анализа КБЖУ. Фото еды → точный расчет калорий, белков, жиров и углеводов за секунды!">
     <meta name="keywords" content="КБЖУ, калории, питание, диета, анализ еды, ИИ, GPT-4, Telegram бот">
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            overflow-x: hidden;
-        }}
-
-        /* Animated background */
-        .hero {{
-            min-height: 100vh;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #667eea 100%);
-            background-size: 400% 400%;
-            animation: gradientShift 15s ease infinite;
-            position: relative;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            text-align: center;
-            color: white;
-        }}
-
-        @keyframes gradientShift {{
-            0% {{ background-position: 0% 50%; }}
-            50% {{ background-position: 100% 50%; }}
-            100% {{ background-position: 0% 50%; }}
-        }}
-
-        .hero::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><defs><pattern id="grain" width="100" height="100" patternUnits="userSpaceOnUse"><circle cx="25" cy="25" r="1" fill="white" opacity="0.1"/><circle cx="75" cy="75" r="1" fill="white" opacity="0.1"/><circle cx="50" cy="10" r="0.5" fill="white" opacity="0.1"/><circle cx="10" cy="60" r="0.5" fill="white" opacity="0.1"/><circle cx="90" cy="30" r="0.5" fill="white" opacity="0.1"/></pattern></defs><rect width="100" height="100" fill="url(%23grain)"/></svg>');
-            pointer-events: none;
-        }}
-
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 0 20px;
-            position: relative;
-            z-index: 1;
-        }}
-
-        .hero-content {{
-            max-width: 800px;
-            margin: 0 auto;
-        }}
-
-        .logo {{
-            font-size: 5rem;
-            margin-bottom: 1rem;
-            animation: float 6s ease-in-out infinite;
-        }}
-
-        @keyframes float {{
-            0%, 100% {{ transform: translateY(0px); }}
-            50% {{ transform: translateY(-20px); }}
-        }}
-
-        .hero h1 {{
-            font-size: 3.5rem;
-            font-weight: 700;
-            margin-bottom: 1rem;
-            text-shadow: 2px 2px 20px rgba(0,0,0,0.3);
-            background: linear-gradient(45deg, #fff, #f0f8ff);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }}
-
-        .hero h2 {{
-            font-size: 1.5rem;
-            font-weight: 300;
-            margin-bottom: 2rem;
-            opacity: 0.95;
-            text-shadow: 1px 1px 10px rgba(0,0,0,0.2);
-        }}
-
-        .hero p {{
-            font-size: 1.2rem;
-            margin-bottom: 3rem;
-            opacity: 0.9;
-            line-height: 1.8;
-            max-width: 600px;
-            margin-left: auto;
-            margin-right: auto;
-        }}
-
-        .cta-button {{
-            display: inline-block;
-            background: linear-gradient(45deg, #ff6b6b, #feca57);
-            color: white;
-            padding: 18px 40px;
-            font-size: 1.2rem;
-            font-weight: 600;
-            text-decoration: none;
-            border-radius: 50px;
-            box-shadow: 0 10px 30px rgba(255, 107, 107, 0.4);
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-        }}
-
-        .cta-button::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(255,255,255,0.3), transparent);
-            transition: left 0.5s;
-        }}
-
-        .cta-button:hover::before {{
-            left: 100%;
-        }}
-
-        .cta-button:hover {{
-            transform: translateY(-5px);
-            box-shadow: 0 15px 40px rgba(255, 107, 107, 0.6);
-        }}
-
-        .features {{
-            padding: 100px 0;
-            background: #f8f9fa;
-        }}
-
-        .features-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 40px;
-            margin-top: 60px;
-        }}
-
-        .feature-card {{
-            background: white;
-            padding: 40px 30px;
-            border-radius: 20px;
-            text-align: center;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.1);
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-        }}
-
-        .feature-card::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            height: 4px;
-            background: linear-gradient(45deg, #667eea, #764ba2);
-        }}
-
-        .feature-card:hover {{
-            transform: translateY(-10px);
-            box-shadow: 0 20px 60px rgba(0,0,0,0.15);
-        }}
-
-        .feature-icon {{
-            font-size: 3.5rem;
-            margin-bottom: 20px;
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }}
-
-        .feature-card h3 {{
-            font-size: 1.5rem;
-            margin-bottom: 15px;
-            color: #333;
-        }}
-
-        .feature-card p {{
-            color: #666;
-            line-height: 1.7;
-        }}
-
-        .stats {{
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            color: white;
-            padding: 80px 0;
-            text-align: center;
-        }}
-
-        .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 40px;
-            margin-top: 50px;
-        }}
-
-        .stat-item {{
-            text-align: center;
-        }}
-
-        .stat-number {{
-            font-size: 3rem;
-            font-weight: 700;
-            margin-bottom: 10px;
-            background: linear-gradient(45deg, #fff, #f0f8ff);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }}
-
-        .stat-label {{
-            font-size: 1.1rem;
-            opacity: 0.9;
-        }}
-
-        .pricing {{
-            padding: 100px 0;
-            background: white;
-            text-align: center;
-        }}
-
-        .pricing-cards {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-            gap: 30px;
-            margin-top: 60px;
-            max-width: 900px;
-            margin-left: auto;
-            margin-right: auto;
-        }}
-
-        .pricing-card {{
-            background: white;
-            border: 2px solid #e9ecef;
-            border-radius: 20px;
-            padding: 40px 30px;
-            position: relative;
-            transition: all 0.3s ease;
-        }}
-
-        .pricing-card.featured {{
-            border-color: #667eea;
-            transform: scale(1.05);
-            box-shadow: 0 20px 60px rgba(102, 126, 234, 0.2);
-        }}
-
-        .pricing-card.featured::before {{
-            content: 'Популярный';
-            position: absolute;
-            top: -15px;
-            left: 50%;
-            transform: translateX(-50%);
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            color: white;
-            padding: 8px 20px;
-            border-radius: 20px;
-            font-size: 0.9rem;
-            font-weight: 600;
-        }}
-
-        .price {{
-            font-size: 3rem;
-            font-weight: 700;
-            color: #667eea;
-            margin: 20px 0;
-        }}
-
-        .price-period {{
-            font-size: 1rem;
-            color: #666;
-            font-weight: 400;
-        }}
-
-        .features-list {{
-            list-style: none;
-            padding: 0;
-            margin: 30px 0;
-        }}
-
-        .features-list li {{
-            padding: 10px 0;
-            color: #666;
-            position: relative;
-            padding-left: 30px;
-        }}
-
-        .features-list li::before {{
-            content: '✓';
-            position: absolute;
-            left: 0;
-            color: #28a745;
-            font-weight: bold;
-        }}
-
-        .footer {{
-            background: #2d3748;
-            color: white;
-            padding: 60px 0 30px;
-            text-align: center;
-        }}
-
-        .footer-content {{
-            max-width: 800px;
-            margin: 0 auto;
-        }}
-
-        .status-indicator {{
-            position: fixed;
-            bottom: 30px;
-            right: 30px;
-            background: rgba(40, 167, 69, 0.95);
-            color: white;
-            padding: 15px 20px;
-            border-radius: 50px;
-            font-size: 0.9rem;
-            font-weight: 600;
-            box-shadow: 0 10px 30px rgba(40, 167, 69, 0.3);
-            backdrop-filter: blur(10px);
-            z-index: 1000;
-            animation: pulse 2s infinite;
-        }}
-
-        @keyframes pulse {{
-            0%, 100% {{ transform: scale(1); }}
-            50% {{ transform: scale(1.05); }}
-        }}
-
-        .section-title {{
-            font-size: 2.5rem;
-            font-weight: 700;
-            margin-bottom: 20px;
-            text-align: center;
-        }}
-
-        .section-subtitle {{
-            font-size: 1.2rem;
-            color: #666;
-            text-align: center;
-            max-width: 600px;
-            margin: 0 auto;
-        }}
-
-        /* Mobile responsiveness */
-        @media (max-width: 768px) {{
-            .hero h1 {{ font-size: 2.5rem; }}
-            .hero h2 {{ font-size: 1.2rem; }}
-            .hero p {{ font-size: 1rem; }}
-            .logo {{ font-size: 3rem; }}
-            .cta-button {{ padding: 15px 30px; font-size: 1rem; }}
-            .features {{ padding: 60px 0; }}
-            .pricing {{ padding: 60px 0; }}
-            .stats {{ padding: 60px 0; }}
-            .section-title {{ font-size: 2rem; }}
-            .pricing-card.featured {{ transform: none; }}
-        }}
-
-        /* Scroll animations */
-        .fade-in {{
-            opacity: 0;
-            transform: translateY(30px);
-            transition: all 0.6s ease;
-        }}
-
-        .fade-in.visible {{
-            opacity: 1;
-            transform: translateY(0);
-        }}
-    </style>
+    <link rel="stylesheet" href="/static/snapeat.css?v={asset_version}">
 </head>
 <body>
     <!-- Hero Section -->
@@ -584,174 +214,370 @@ def main():
     </div>
 
     <!-- Scroll Animation Script -->
-    <script>
-        // Intersection Observer for fade-in animations
-        const observerOptions = {{
-            threshold: 0.1,
-            rootMargin: '0px 0px -50px 0px'
-        }};
-
-        const observer = new IntersectionObserver((entries) => {{
-            entries.forEach(entry => {{
-                if (entry.isIntersecting) {{
-                    entry.target.classList.add('visible');
-                }}
-            }});
-        }}, observerOptions);
-
-        // Observe all fade-in elements
-        document.querySelectorAll('.fade-in').forEach(el => {{
-            observer.observe(el);
-        }});
-
-        // Add some random floating particles
-        function createParticle() {{
-            const particle = document.createElement('div');
-            particle.style.cssText = `
-                position: fixed;
-                width: 4px;
-                height: 4px;
-                background: rgba(255,255,255,0.1);
-                border-radius: 50%;
-                pointer-events: none;
-                z-index: 0;
-                left: ${{Math.random() * 100}}vw;
-                top: 100vh;
-                animation: floatUp ${{5 + Math.random() * 5}}s linear forwards;
-            `;
-
-            document.body.appendChild(particle);
-
-            setTimeout(() => {{
-                particle.remove();
-            }}, 10000);
-        }}
-
-        // Add CSS for floating animation
-        const style = document.createElement('style');
-        style.textContent = `
-            @keyframes floatUp {{
-                to {{
-                    transform: translateY(-100vh) rotate(360deg);
-                    opacity: 0;
-                }}
-            }}
-        `;
-        document.head.appendChild(style);
-
-        // Create particles periodically
-        setInterval(createParticle, 3000);
-    </script>
+    <script defer src="/static/snapeat.js?v={asset_version}"></script>
 </body>
-</html>''', 200, {'Content-Type': 'text/html; charset=utf-8'}
+</html>''')
 
-    @app.route('/status', methods=['GET'])
-    def status():
-        """Health check endpoint для мониторинга"""
-        try:
-            from database.db_manager import DatabaseManager
-            health = DatabaseManager.get_database_health()
-            return f'''<!DOCTYPE html>
+# Главная страница меняется только вместе со статистикой: готовые тела (обычное и gzip)
+# пересобираются при смене ETag, клиентам разрешено кэшировать страницу на 30 секунд
+HOME_CACHE_CONTROL = 'public, max-age=30'
+
+# CSS и JS главной страницы отдаются отдельными файлами с годовым кэшем;
+# версия в ссылке меняется вместе с содержимым файлов
+STATIC_DIR = os.path.join(script_dir, 'static')
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+STATIC_CACHE_CONTROL = f'public, max-age={STATIC_MAX_AGE}, immutable'
+
+
+def _static_version(*filenames):
+    """Контрольная сумма статических файлов для сброса кэша браузера"""
+    checksum = 0
+    for filename in filenames:
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            checksum = zlib.crc32(f.read(), checksum)
+    return format(checksum, '08x')
+
+
+_ASSET_VERSION = _static_version('snapeat.css', 'snapeat.js')
+_HOME_VERSION = format(zlib.crc32(b''.join(_HOME_PARTS[0]) + _ASSET_VERSION.encode('ascii')), '08x')
+_home_cache = {'etag': None, 'variants': None}
+_home_cache_lock = threading.Lock()
+
+
+class _PrebuiltResponse(Response):
+    """Ответ с заранее собранными заголовками: Content-Length уже посчитан, werkzeug его не пересчитывает"""
+    automatically_set_content_length = False
+
+
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+
+
+def _html_headers(body, *extra):
+    """Заголовки HTML-ответа с готовым Content-Length"""
+    return [('Content-Type', HTML_CONTENT_TYPE), ('Content-Length', str(len(body))), *extra]
+
+
+def _home_variants(total_users, total_analyses):
+    """
+    Готовые ответы главной страницы для текущей статистики
+
+    Returns:
+        tuple: (etag, {'identity' и 'gzip': (тело, заголовки), 'not_modified': заголовки})
+    """
+    etag = f'{_HOME_VERSION}-{total_users}-{total_analyses}'
+    with _home_cache_lock:
+        if _home_cache['etag'] != etag:
+            body = _render_template(
+                _HOME_PARTS,
+                asset_version=_ASSET_VERSION,
+                total_users=total_users,
+                total_analyses=total_analyses
+            )
+            body_gzip = gzip.compress(body, 9)
+            common = [('Cache-Control', HOME_CACHE_CONTROL), ('ETag', f'"{etag}"'), ('Vary', 'Accept-Encoding')]
+            _home_cache.update(etag=etag, variants={
+                'identity': (body, _html_headers(body, *common)),
+                'gzip': (body_gzip, _html_headers(body_gzip, ('Content-Encoding', 'gzip'), *common)),
+                'not_modified': common
+            })
+        return _home_cache['etag'], _home_cache['variants']
+
+
+# Страница /status: шаблоны успеха и ошибки кодируются один раз при загрузке
+_STATUS_OK_PARTS = _compile_template('''<!DOCTYPE html>
 <html>
 <head>
     <title>SnapEat Bot Status</title>
     <meta charset="utf-8">
     <style>
-        body {{ font-family: Arial, sans-serif; padding: 20px; background: #f8f9fa; }}
-        .container {{ max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 5px 20px rgba(0,0,0,0.1); }}
-        .status-good {{ color: #28a745; font-size: 1.2rem; }}
-        .status-bad {{ color: #dc3545; font-size: 1.2rem; }}
-        table {{ width: 100%; border-collapse: collapse; margin-top: 25px; }}
-        td {{ padding: 12px; border-bottom: 1px solid #eee; }}
-        .metric {{ font-weight: bold; color: #495057; }}
-        .back-link {{ display: inline-block; margin-top: 25px; padding: 10px 20px; background: #667eea; color: white; text-decoration: none; border-radius: 25px; }}
-        .back-link:hover {{ background: #5a6fd8; }}
-        h2 {{ color: #333; margin-bottom: 20px; }}
+        body { font-family: Arial, sans-serif; padding: 20px; background: #f8f9fa; }
+        .container { max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 5px 20px rgba(0,0,0,0.1); }
+        .status-good { color: #28a745; font-size: 1.2rem; }
+        .status-bad { color: #dc3545; font-size: 1.2rem; }
+        table { width: 100%; border-collapse: collapse; margin-top: 25px; }
+        td { padding: 12px; border-bottom: 1px solid #eee; }
+        .metric { font-weight: bold; color: #495057; }
+        .back-link { display: inline-block; margin-top: 25px; padding: 10px 20px; background: #667eea; color: white; text-decoration: none; border-radius: 25px; }
+        .back-link:hover { background: #5a6fd8; }
+        h2 { color: #333; margin-bottom: 20px; }
     </style>
 </head>
 <body>
     <div class="container">
         <h2>🤖 SnapEat Bot Status</h2>
-        <p class="status-good"><strong>Status:</strong> {health['status']} ✅</p>
+        <p class="status-good"><strong>Status:</strong> {status} ✅</p>
 
         <table>
-            <tr><td class="metric">Database:</td><td>{health['database_type']}</td></tr>
-            <tr><td class="metric">Users:</td><td>{health['total_users']}</td></tr>
-            <tr><td class="metric">Analyses:</td><td>{health['total_analyses']}</td></tr>
-            <tr><td class="metric">Active Subscriptions:</td><td>{health['active_subscriptions']}</td></tr>
-            <tr><td class="metric">Last Check:</td><td>{health['timestamp'][:19]}</td></tr>
+            <tr><td class="metric">Database:</td><td>{database_type}</td></tr>
+            <tr><td class="metric">Users:</td><td>{total_users}</td></tr>
+            <tr><td class="metric">Analyses:</td><td>{total_analyses}</td></tr>
+            <tr><td class="metric">Active Subscriptions:</td><td>{active_subscriptions}</td></tr>
+            <tr><td class="metric">Last Check:</td><td>{timestamp}</td></tr>
         </table>
 
         <a href="/" class="back-link">← Вернуться на главную</a>
     </div>
 </body>
-</html>''', 200, {'Content-Type': 'text/html; charset=utf-8'}
-        except Exception as e:
-            return f'''<!DOCTYPE html>
+</html>''')
+
+_STATUS_ERR_PARTS = _compile_template('''<!DOCTYPE html>
 <html>
 <head>
     <title>SnapEat Bot Status - Error</title>
     <meta charset="utf-8">
     <style>
-        body {{ font-family: Arial, sans-serif; padding: 20px; background: #f8f9fa; }}
-        .container {{ max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 5px 20px rgba(0,0,0,0.1); }}
-        .error {{ color: #dc3545; }}
-        .back-link {{ display: inline-block; margin-top: 25px; padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 25px; }}
+        body { font-family: Arial, sans-serif; padding: 20px; background: #f8f9fa; }
+        .container { max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 5px 20px rgba(0,0,0,0.1); }
+        .error { color: #dc3545; }
+        .back-link { display: inline-block; margin-top: 25px; padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 25px; }
     </style>
 </head>
 <body>
     <div class="container">
         <h2>❌ SnapEat Bot Status</h2>
         <p class="error"><strong>Status:</strong> Error</p>
-        <p class="error"><strong>Error Details:</strong> {str(e)}</p>
+        <p class="error"><strong>Error Details:</strong> {error}</p>
         <a href="/" class="back-link">← Вернуться на главную</a>
     </div>
 </body>
-</html>''', 503, {'Content-Type': 'text/html; charset=utf-8'}
+</html>''')
 
-    @app.route(f'/{TELEGRAM_BOT_TOKEN}/', methods=['POST'])
-    def webhook():
-        logger.info("Получен webhook запрос")
-        try:
-            if request.headers.get('content-type') == 'application/json':
-                json_string = request.get_data().decode('utf-8')
-                logger.info(f"Получены данные webhook: {json_string[:100]}...")
 
-                update_dict = apihelper.json.loads(json_string)
-                logger.info("JSON успешно разобран")
+# Последняя отрисованная страница /status вместе с состоянием БД, из которого она собрана
+_status_cache = {'entry': None}
+
 
-                update_obj = telebot.types.Update.de_json(update_dict)
-                logger.info("Преобразовано в объект Update")
+# Статистика БД для / и /status: не больше одного запроса к БД за HEALTH_CACHE_TTL секунд.
+# Устаревшее значение обновляет один запрос, остальные тем временем получают прежнее,
+# так что задержка БД не блокирует другие потоки gunicorn
+HEALTH_CACHE_TTL = 5.0
+_health_cache = {'time': 0.0, 'value': None, 'refreshing': False}
+_health_lock = threading.Lock()
 
-                bot.process_new_updates([update_obj])
-                logger.info("Webhook успешно обработан")
 
-                return 'OK'
-            else:
-                logger.warning(f"Неверный content-type: {request.headers.get('content-type')}")
-                abort(403)
+def _cached_health():
+    """Состояние БД из кэша; ждать запроса к БД приходится только при самом первом обращении"""
+    with _health_lock:
+        value = _health_cache['value']
+        if value is None:
+            _health_cache['value'] = DatabaseManager.get_database_health()
+            _health_cache['time'] = time.monotonic()
+            return _health_cache['value']
+
+        if _health_cache['refreshing'] or time.monotonic() - _health_cache['time'] <= HEALTH_CACHE_TTL:
+            return value
+        _health_cache['refreshing'] = True
+
+    try:
+        health = DatabaseManager.get_database_health()
+        with _health_lock:
+            _health_cache['value'] = health
+            _health_cache['time'] = time.monotonic()
+        return health
+    finally:
+        with _health_lock:
+            _health_cache['refreshing'] = False
+
+
+# Очередь обновлений Telegram: webhook только ставит обновление в очередь и сразу отвечает 200.
+# Один поток-диспетчер сохраняет порядок обновлений (важно для next_step-обработчиков),
+# сами обработчики telebot выполняет в своем пуле потоков
+UPDATE_WORKERS = 1
+UPDATE_BATCH_SIZE = 32
+_update_queue = queue.Queue()
+_update_workers_started = threading.Event()
+_update_workers_lock = threading.Lock()
+
+
+def _process_updates_worker():
+    """Передает обновления из очереди в telebot пачками до UPDATE_BATCH_SIZE штук"""
+    while True:
+        batch = [_update_queue.get()]
+        try:
+            while len(batch) < UPDATE_BATCH_SIZE:
+                batch.append(_update_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        try:
+            bot.process_new_updates(batch)
         except Exception as e:
-            logger.error(f"Ошибка при обработке webhook: {str(e)}")
-            import traceback
+            logger.error(f"Ошибка при обработке обновления: {str(e)}")
             logger.error(traceback.format_exc())
-            return str(e), 500
 
-    cleanup_thread = threading.Thread(target=cleanup_user_data, daemon=True)
-    cleanup_thread.start()
-    logger.info("🧹 Запущен фоновый поток очистки user_data")
 
-    start_cleanup()
+def _start_update_workers():
+    """Запускает потоки обработки очереди (один раз на процесс, при первом обновлении)"""
+    if _update_workers_started.is_set():
+        return
+    with _update_workers_lock:
+        if _update_workers_started.is_set():
+            return
+        for i in range(UPDATE_WORKERS):
+            threading.Thread(target=_process_updates_worker, name=f"update-worker-{i}", daemon=True).start()
+        _update_workers_started.set()
+
+
+# Flask-приложение на уровне модуля: воркер gunicorn загружает его как run_webhook:app
+app = Flask(__name__, static_folder=None)
+
+# Обновления Telegram на практике не больше ~100 КБ; более крупные тела отклоняются с 413
+WEBHOOK_MAX_CONTENT_LENGTH = 256 * 1024
+# Тело без Content-Length werkzeug обрезает на MAX_CONTENT_LENGTH: лишний байт позволяет
+# отличить тело ровно в WEBHOOK_MAX_CONTENT_LENGTH от обрезанного более длинного
+app.config['MAX_CONTENT_LENGTH'] = WEBHOOK_MAX_CONTENT_LENGTH + 1
+
+
+@app.route('/static/<path:filename>', methods=['GET'])
+def static_files(filename):
+    """Статические файлы главной страницы с долгим кэшем"""
+    response = send_from_directory(STATIC_DIR, filename, max_age=STATIC_MAX_AGE)
+    response.headers['Cache-Control'] = STATIC_CACHE_CONTROL
+    return response
+
+
+@app.route('/', methods=['GET'])
+def home():
+    """Красивая главная страница SnapEat"""
+    try:
+        # Получаем статистику из БД (кэшируется на HEALTH_CACHE_TTL секунд)
+        health = _cached_health()
+
+        # Используем реальные данные или дефолтные
+        total_users = health.get('total_users', 9)
+        total_analyses = health.get('total_analyses', 150)
+
+    except Exception as e:
+        logger.error(f"Ошибка получения статистики: {str(e)}")
+        # Fallback значения
+        total_users = 9
+        total_analyses = 150
+
+    etag, variants = _home_variants(total_users, total_analyses)
+
+    if request.if_none_match.contains(etag):
+        return _PrebuiltResponse(status=304, headers=variants['not_modified'])
+
+    body, headers = variants['gzip' if 'gzip' in request.accept_encodings else 'identity']
+    return _PrebuiltResponse(body, headers=headers, direct_passthrough=True)
+
+@app.route('/status', methods=['GET'])
+def status():
+    """Health check endpoint для мониторинга"""
+    try:
+        health = _cached_health()
+
+        # Страница пересобирается только при обновлении кэша состояния БД
+        cached = _status_cache['entry']
+        if cached is None or cached[0] is not health:
+            body = _render_template(
+                _STATUS_OK_PARTS,
+                status=health['status'],
+                database_type=health['database_type'],
+                total_users=health['total_users'],
+                total_analyses=health['total_analyses'],
+                active_subscriptions=health['active_subscriptions'],
+                timestamp=health['timestamp'][:19]
+            )
+            cached = (health, body, _html_headers(body))
+            _status_cache['entry'] = cached
+
+        return _PrebuiltResponse(cached[1], status=200, headers=cached[2], direct_passthrough=True)
+    except Exception as e:
+        body = _render_template(_STATUS_ERR_PARTS, error=html.escape(str(e)))
+        return _PrebuiltResponse(body, status=503, headers=_html_headers(body), direct_passthrough=True)
+
+# Webhook принимается по короткому пути без токена бота; подлинность запроса проверяется
+# по секрету из заголовка X-Telegram-Bot-Api-Secret-Token (задается при set_webhook).
+# Если секрет не задан в конфиге, он выводится из токена: допустимы только A-Z, a-z, 0-9, _ и -
+WEBHOOK_PATH = '/tg'
+WEBHOOK_SECRET_TOKEN = (
+    getattr(config, 'WEBHOOK_SECRET_TOKEN', None)
+    or hashlib.sha256(TELEGRAM_BOT_TOKEN.encode('utf-8')).hexdigest()
+)
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET_TOKEN.encode('utf-8')
+
+
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def webhook():
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '').encode('utf-8')
+    if not secrets.compare_digest(secret, _WEBHOOK_SECRET_BYTES):
+        logger.warning("Webhook запрос с неверным секретом")
+        abort(403)
+
+    # is_json учитывает и "application/json; charset=utf-8"
+    if not request.is_json:
+        logger.warning(f"Неверный content-type: {request.content_type}")
+        abort(403)
 
-    logger.info(f"Запуск сервера на {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+    if request.content_length is not None and request.content_length > WEBHOOK_MAX_CONTENT_LENGTH:
+        logger.warning(f"Слишком большой webhook запрос: {request.content_length} байт")
+        abort(413)
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Получен webhook запрос")
+    try:
+        # Разбираем байты напрямую, без decode и без кэширования тела запроса
+        raw = request.get_data(cache=False)
+        # Тело без Content-Length werkzeug обрезает на MAX_CONTENT_LENGTH
+        if len(raw) > WEBHOOK_MAX_CONTENT_LENGTH:
+            abort(413)
+        if debug:
+            logger.debug(f"Получены данные webhook: {raw[:100].decode('utf-8', 'replace')}...")
+
+        update_dict = orjson.loads(raw)
+        update_obj = telebot.types.Update.de_json(update_dict)
+
+        # Обработка идет в фоне, Telegram получает ответ сразу
+        _start_update_workers()
+        _update_queue.put_nowait(update_obj)
+        if debug:
+            logger.debug("Webhook поставлен в очередь обработки")
+
+        return 'OK'
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при обработке webhook: {str(e)}")
+        logger.error(traceback.format_exc())
+        return str(e), 500
+
+
+# Один процесс-воркер gunicorn с потоками gthread, настройки - в gunicorn.conf.py
+GUNICORN_CONFIG = os.path.join(script_dir, 'gunicorn.conf.py')
+
+
+def main():
+    # Удаляем текущий вебхук, если есть
+    logger.info("Удаление текущего вебхука...")
+    bot.remove_webhook()
+
+    # Параметры для webhook
+    webhook_url = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
+    logger.info(f"Настройка вебхука на {webhook_url}")
+
+    # Сертификат читаем целиком, чтобы файл сразу закрылся
+    certificate = None
+    if WEBHOOK_SSL_CERT:
+        with open(WEBHOOK_SSL_CERT, 'rb') as cert_file:
+            certificate = cert_file.read()
+
+    # Устанавливаем вебхук
+    bot.set_webhook(
+        url=webhook_url,
+        certificate=certificate,
+        secret_token=WEBHOOK_SECRET_TOKEN
+    )
 
+    logger.info(f"Запуск gunicorn на {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
 
+    # Процесс заменяется gunicorn: сначала дописываем очередь логов в файл
+    log_listener.stop()
     try:
-        app.run(
-            host='0.0.0.0',
-            port=WEBHOOK_PORT,
-            debug=False
-        )
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONFIG, 'run_webhook:app'])
     except Exception as e:
+        log_listener.start()
         logger.error(f"Ошибка при запуске сервера: {e}")
         raise
 
@@ -0,0 +1,54 @@
+// Fade-in: CSS animation-timeline when supported, Intersection Observer otherwise
+if (!(window.CSS && CSS.supports('animation-timeline: view()'))) {
+    const observerOptions = {
+        threshold: 0.1,
+        rootMargin: '0px 0px -50px 0px'
+    };
+
+    const observer = new IntersectionObserver((entries) => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                entry.target.classList.add('visible');
+                observer.unobserve(entry.target);
+            }
+        });
+    }, observerOptions);
+
+    document.querySelectorAll('.fade-in').forEach(el => {
+        observer.observe(el);
+    });
+}
+
+// Floating particles: a bounded pool of reused nodes instead of a new element every tick
+const PARTICLE_POOL_SIZE = 10;
+const reducedMotion = window.matchMedia('(prefers-reduced-motion: reduce)');
+const particles = [];
+let nextParticle = 0;
+
+function launchParticle() {
+    if (document.hidden || reducedMotion.matches) {
+        return;
+    }
+
+    let particle = particles[nextParticle];
+    if (!particle) {
+        particle = document.createElement('div');
+        particle.className = 'particle';
+        document.body.appendChild(particle);
+        particles[nextParticle] = particle;
+    }
+    nextParticle = (nextParticle + 1) % PARTICLE_POOL_SIZE;
+
+    particle.style.left = `${Math.random() * 100}vw`;
+    particle.style.animationDuration = `${5 + Math.random() * 5}s`;
+
+    // Restart the finished animation of a reused node
+    const animation = particle.getAnimations ? particle.getAnimations()[0] : null;
+    if (animation) {
+        animation.currentTime = 0;
+        animation.play();
+    }
+}
+
+// Launch particles periodically
+setInterval(launchParticle, 3000);
@@ -0,0 +1,64 @@
+"""
+Общие настройки тестов
+
+config.py с токенами и адресом БД в репозиторий не входит: тесты подставляют свой модуль config
+с временной SQLite-базой до импорта модулей проекта
+"""
+# webhook_server.py при импорте патчит стандартную библиотеку gevent; как и воркер
+# gunicorn -k gevent, делаем это раньше импорта остальных модулей
+from gevent import monkey
+monkey.patch_all()
+
+import json
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix='kanki-tests-')
+
+config = types.ModuleType('config')
+config.__dict__.update(
+    TELEGRAM_BOT_TOKEN='123456:TEST',
+    WEBHOOK_HOST='example.com',
+    WEBHOOK_PORT=8443,
+    WEBHOOK_LISTEN='127.0.0.1',
+    WEBHOOK_URL='https://example.com',
+    WEBHOOK_SSL_CERT=None,
+    WEBHOOK_SSL_PRIV=None,
+    LOG_FILE=os.path.join(TEST_DIR, 'bot.log'),
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    IS_POSTGRESQL=False,
+    DB_POOL_SIZE=5,
+    DB_MAX_OVERFLOW=5,
+    DB_POOL_TIMEOUT=10,
+    DB_POOL_RECYCLE=3600,
+    FREE_REQUESTS_LIMIT=5,
+    SUBSCRIPTION_COST=299,
+    PAYMENT_PROVIDER_TOKEN='test',
+    AITUNNEL_API_KEY='test',
+    GOOGLE_APPLICATION_CREDENTIALS=os.path.join(TEST_DIR, 'google.json'),
+    YUKASSA_SHOP_ID='test',
+    YUKASSA_SECRET_KEY='test',
+)
+sys.modules['config'] = config
+
+# Клиент Google Vision создается при импорте bot.py; учетные данные проверяются только при запросе
+with open(config.GOOGLE_APPLICATION_CREDENTIALS, 'w') as f:
+    json.dump({'type': 'authorized_user', 'client_id': 'test', 'client_secret': 'test', 'refresh_token': 'test'}, f)
+
+# Глобальный коллектор метрик пишет data/metrics.json относительно рабочего каталога
+os.chdir(TEST_DIR)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def close_metrics_collector():
+    """Финальное сохранение глобального коллектора метрик - во временный каталог, а не по atexit"""
+    yield
+    from monitoring.metrics import metrics_collector
+    metrics_collector.close()
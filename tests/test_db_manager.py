@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta, time
+
+import pytest
+from sqlalchemy import delete, insert, select, func
+
+from database import db_manager
+from database.db_manager import DatabaseManager
+from database.models import Base, User, FoodAnalysis, UserDailyRollup, init_db
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Каждый тест начинает с пустой БД и пустого кэша ID пользователей"""
+    yield
+    with db_manager.engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+    db_manager._user_id_cache.clear()
+
+
+def _analysis(name, calories, analysis_time=None):
+    return {
+        'food_name': name,
+        'calories': calories,
+        'proteins': calories / 10,
+        'fats': calories / 20,
+        'carbs': calories / 5,
+        'analysis_time': analysis_time,
+    }
+
+
+def _totals_from_analyses(telegram_id):
+    """Статистика, посчитанная напрямую по food_analyses"""
+    with db_manager.get_readonly_session() as session:
+        row = session.execute(
+            select(
+                func.count(FoodAnalysis.id),
+                func.coalesce(func.sum(FoodAnalysis.calories), 0),
+                func.coalesce(func.sum(FoodAnalysis.proteins), 0),
+                func.coalesce(func.sum(FoodAnalysis.fats), 0),
+                func.coalesce(func.sum(FoodAnalysis.carbs), 0)
+            ).join(User, User.id == FoodAnalysis.user_id).where(User.telegram_id == telegram_id)
+        ).one()
+
+    return {
+        'total_analyses': row[0],
+        'total_calories': round(row[1], 1),
+        'total_proteins': round(row[2], 1),
+        'total_fats': round(row[3], 1),
+        'total_carbs': round(row[4], 1),
+    }
+
+
+def test_nutrition_stats_for_date_groups_by_meal_type():
+    day = datetime.utcnow().date() - timedelta(days=1)
+
+    def at(hour):
+        return datetime.combine(day, time(hour))
+
+    DatabaseManager.save_food_analyses(1101, [
+        _analysis('Каша', 300, at(8)),
+        _analysis('Кофе', 20, at(9)),
+        _analysis('Суп', 250, at(13)),
+        _analysis('Орехи', 100, at(22)),
+        _analysis('Вчерашний ужин', 500, at(19) - timedelta(days=1)),
+    ])
+    # Анализы без типа приема пищи (NULL и пустая строка) считаются перекусом
+    user_id = db_manager._user_id_cache[1101]
+    with db_manager.engine.begin() as conn:
+        conn.execute(insert(FoodAnalysis), [
+            {'user_id': user_id, 'food_name': 'Яблоко', 'calories': 50, 'analysis_date': at(15), 'meal_type': None},
+            {'user_id': user_id, 'food_name': 'Груша', 'calories': 60, 'analysis_date': at(16), 'meal_type': ''},
+        ])
+
+    stats = DatabaseManager.get_nutrition_stats_for_date(1101, day)
+
+    assert stats['breakfast']['count'] == 2
+    assert stats['breakfast']['calories'] == 320.0
+    assert stats['breakfast']['proteins'] == 32.0
+    assert stats['lunch']['count'] == 1 and stats['lunch']['calories'] == 250.0
+    assert stats['dinner']['count'] == 0 and stats['dinner']['calories'] == 0
+    assert stats['snack']['count'] == 3 and stats['snack']['calories'] == 210.0
+    assert stats['total']['count'] == 6 and stats['total']['calories'] == 780.0
+
+    assert [item['name'] for item in stats['breakfast']['items']] == ['Каша', 'Кофе']
+    assert {item['name'] for item in stats['snack']['items']} == {'Яблоко', 'Груша', 'Орехи'}
+    assert len(stats['total']['items']) == 6
+
+
+def test_nutrition_stats_for_date_without_items():
+    day = datetime.utcnow().date()
+    DatabaseManager.save_food_analyses(1102, [_analysis('Омлет', 200, datetime.combine(day, time.min))])
+
+    stats = DatabaseManager.get_nutrition_stats_for_date(1102, day, include_items=False)
+
+    assert stats['total']['count'] == 1 and stats['total']['calories'] == 200.0
+    assert all(not meal['items'] for meal in stats.values())
+    assert DatabaseManager.get_nutrition_stats_for_date(9999, day) is None
+
+
+def test_save_food_analyses_updates_rollup():
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    items = [
+        _analysis('Каша', 300, yesterday.replace(hour=8)),
+        _analysis('Суп', 250, yesterday.replace(hour=13)),
+        _analysis('Салат', 120),
+    ]
+
+    ids = DatabaseManager.save_food_analyses(1001, items)
+    DatabaseManager.save_food_analysis(1001, 'Яблоко', 52, 0.3, 0.2, 14)
+
+    assert len(ids) == 3 and len(set(ids)) == 3
+    stats = DatabaseManager.get_user_statistics(1001)
+    assert stats == _totals_from_analyses(1001)
+    assert stats['total_analyses'] == 4
+    assert stats['total_calories'] == 722.0
+
+    with db_manager.get_readonly_session() as session:
+        days = session.execute(select(UserDailyRollup.day, UserDailyRollup.analyses_count)).all()
+    assert sorted(count for _, count in days) == [2, 2]
+
+
+def test_init_db_fills_rollup_for_existing_analyses():
+    """Таблица агрегатов, появившаяся в существующей БД, заполняется до первого чтения"""
+    DatabaseManager.save_food_analysis(1003, 'Омлет', 200, 14, 15, 2)
+    DatabaseManager.save_food_analysis(1003, 'Кофе', 10, 0, 0, 2)
+    UserDailyRollup.__table__.drop(db_manager.engine)
+
+    init_db().dispose()
+    DatabaseManager.save_food_analysis(1003, 'Сыр', 100, 7, 8, 0)
+
+    stats = DatabaseManager.get_user_statistics(1003)
+    assert stats == _totals_from_analyses(1003)
+    assert stats['total_analyses'] == 3
+
+
+def test_cleanup_old_data_removes_whole_days():
+    days_to_keep = 90
+    cutoff_day = datetime.utcnow().date() - timedelta(days=days_to_keep)
+    midnight = datetime.combine(cutoff_day, time.min)
+
+    DatabaseManager.save_food_analyses(1004, [
+        _analysis('Старое', 100, midnight - timedelta(seconds=1)),
+        _analysis('Полночь', 200, midnight),
+        _analysis('Вечер', 300, midnight + timedelta(hours=23)),
+        _analysis('Сегодня', 400),
+    ])
+
+    result = DatabaseManager.cleanup_old_data(days_to_keep)
+
+    assert result['deleted_analyses'] == 1
+    stats = DatabaseManager.get_user_statistics(1004)
+    assert stats == _totals_from_analyses(1004)
+    assert stats['total_analyses'] == 3
+    assert stats['total_calories'] == 900.0
+
+
+def test_reconcile_daily_rollup_fixes_recent_days_only():
+    old_time = datetime.utcnow() - timedelta(days=10)
+    DatabaseManager.save_food_analyses(1005, [_analysis('Давно', 100, old_time), _analysis('Сегодня', 200)])
+
+    with db_manager.engine.begin() as conn:
+        conn.execute(UserDailyRollup.__table__.update().values(analyses_count=99, calories=999))
+
+    DatabaseManager.reconcile_daily_rollup()
+
+    with db_manager.get_readonly_session() as session:
+        rows = dict(session.execute(select(UserDailyRollup.day, UserDailyRollup.calories)).all())
+    assert rows[datetime.utcnow().date()] == 200
+    # Дни старше окна сверки не пересчитываются
+    assert rows[old_time.date()] == 999
+
+
+PROFILES = [
+    ('male', 30, 80.0, 180.0, 1.55, 'maintenance'),
+    ('female', 25, 60.0, 165.0, 1.2, 'weight_loss'),
+    ('male', 45, 95.5, 175.0, 1.725, 'weight_gain'),
+    ('female', 52, 71.3, 158.0, 1.9, None),
+]
+
+
+def test_recompute_all_norms_matches_calculate_daily_norms():
+    with db_manager.engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'telegram_id': 2000 + i, 'gender': gender, 'age': age, 'weight': weight,
+             'height': height, 'activity_level': activity, 'goal': goal}
+            for i, (gender, age, weight, height, activity, goal) in enumerate(PROFILES)
+        ])
+        conn.execute(insert(User).values(telegram_id=2999, gender='male', age=30))
+
+    assert DatabaseManager.recompute_all_norms() == len(PROFILES)
+
+    for i, (gender, age, weight, height, activity, goal) in enumerate(PROFILES):
+        expected = DatabaseManager.calculate_daily_norms(
+            gender, age, weight, height, activity, goal or 'maintenance'
+        )
+        actual = DatabaseManager.get_user_daily_norms(2000 + i)
+        for key, value in expected.items():
+            assert actual[key] == pytest.approx(value, abs=0.1)
+
+    # Профиль без всех параметров не пересчитывается
+    assert DatabaseManager.get_user_daily_norms(2999) is None
+
+
+def test_save_food_analyses_reuses_existing_user():
+    DatabaseManager.get_or_create_user(1002, 'user')
+    db_manager._user_id_cache.clear()
+
+    DatabaseManager.save_food_analysis(1002, 'Чай', 5, 0, 0, 1)
+    DatabaseManager.add_subscription(1002)
+    DatabaseManager.save_food_analysis(1002, 'Хлеб', 80, 3, 1, 15)
+
+    with db_manager.get_readonly_session() as session:
+        assert session.execute(select(func.count(User.id))).scalar_one() == 1
+    assert DatabaseManager.get_user_statistics(1002)['total_analyses'] == 2
@@ -0,0 +1,120 @@
+import threading
+
+import gevent
+import orjson
+import pytest
+
+from monitoring.metrics import CounterTable, HyperLogLog, MetricsCollector
+
+
+
+@pytest.fixture
+def collector(tmp_path):
+    collectors = []
+
+    def make():
+        instance = MetricsCollector(save_interval=3600, metrics_file=str(tmp_path / 'metrics.json'))
+        collectors.append(instance)
+        return instance
+
+    yield make
+    for instance in collectors:
+        instance.close()
+
+
+def test_counter_table_trim_keeps_new_names():
+    table = CounterTable({f'cmd{i}': 5 for i in range(4)})
+    table.add('start')
+
+    table.trim(4, new_names=['start'])
+
+    assert len(table) == 4
+    # Новое имя вытесняется последним и сохраняет свой реальный счетчик
+    assert table['start'] == 1
+    assert table.total() == 16 == sum(count for _, count in table.items())
+
+    # При следующем вытеснении 'start' уже не новое и уступает место новому имени
+    table.add('help')
+    table.trim(4, new_names=['help'])
+    assert 'start' not in table
+    assert table['help'] == 1
+    assert table.total() == 16
+
+
+def test_counter_table_trim_without_new_names_evicts_smallest():
+    table = CounterTable({'a': 3, 'b': 1, 'c': 2})
+
+    table.trim(2)
+
+    assert table.to_dict() == {'a': 3, 'c': 2}
+    assert table.total() == 5
+
+
+def test_new_command_survives_full_commands_table(collector):
+    metrics = collector()
+    for i in range(metrics.MAX_UNIQUE_KEYS):
+        metrics.track_batch([('command', f'cmd{i}')] * 3)
+    metrics.get_metrics_summary()
+
+    metrics.track_batch([('command', 'start')])
+    metrics.get_metrics_summary()
+
+    assert metrics.metrics['user_commands']['start'] == 1
+    assert set(metrics.get_metrics_summary()['popular_commands'].values()) == {3}
+    assert len(metrics.metrics['user_commands']) == metrics.MAX_UNIQUE_KEYS
+
+
+def test_hyperloglog_merge_and_sparse_roundtrip():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(range(0, 3000))
+    right.update(range(2000, 5000))
+
+    restored = HyperLogLog.from_sparse(orjson.loads(orjson.dumps(right.to_sparse(), option=orjson.OPT_NON_STR_KEYS)))
+    left.merge(restored)
+
+    assert len(left) == pytest.approx(5000, rel=0.05)
+    assert HyperLogLog().is_empty() and not left.is_empty()
+
+
+def test_journal_replay_restores_metrics(collector, tmp_path):
+    metrics = collector()
+    metrics.track_photo_analysis(111111111)
+    metrics.track_command('start')
+    metrics.track_api_call('vision', 0.5)
+    metrics.save_metrics()  # полный снимок
+
+    for user_id in range(500000000, 500000200):
+        metrics.track_text_analysis(user_id)
+    metrics.track_batch([('command', 'start'), ('error', 'timeout'), ('api_call', 'vision')])
+    metrics.save_metrics()  # строка журнала
+    expected = metrics.get_metrics_summary()
+
+    journal = (tmp_path / 'metrics.json.log').read_bytes()
+    assert journal.count(b'\n') == 1
+    # В журнале только регистры HyperLogLog, без ID пользователей
+    assert b'5000001' not in journal
+
+    restored = collector().get_metrics_summary()
+
+    for key in ('total_api_calls', 'photo_analyses', 'text_analyses', 'unique_users_count',
+                'popular_commands', 'top_errors'):
+        assert restored[key] == expected[key]
+    assert restored['restart_count'] == expected['restart_count'] + 1
+
+
+def test_thread_metrics_stay_bounded_under_greenlets(collector):
+    metrics = collector()
+    # conftest патчит threading gevent'ом: каждый гринлет видит свой threading.local
+    greenlets = [gevent.spawn(metrics.track_command, 'start') for _ in range(5000)]
+    gevent.joinall(greenlets)
+    threads = [threading.Thread(target=metrics.track_photo_analysis, args=(user_id,)) for user_id in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(metrics._thread_metrics) <= metrics.THREAD_METRICS_SHARDS
+
+    summary = metrics.get_metrics_summary()
+    assert summary['popular_commands'] == {'start': 5000}
+    assert summary['photo_analyses'] == 50
@@ -0,0 +1,101 @@
+import io
+
+import orjson
+import pytest
+
+import run_webhook
+import webhook_server
+
+# Обновление без сообщения: обработчики бота не вызываются, запросов к Telegram нет
+UPDATE = orjson.dumps({'update_id': 1})
+
+
+@pytest.fixture
+def run_webhook_client():
+    return run_webhook.app.test_client()
+
+
+@pytest.fixture
+def webhook_server_client():
+    return webhook_server.app.test_client()
+
+
+def _headers(secret, content_type='application/json'):
+    return {'X-Telegram-Bot-Api-Secret-Token': secret, 'Content-Type': content_type}
+
+
+def _body(size):
+    """JSON-обновление ровно size байт"""
+    body = b'{"update_id": 1, "pad": "' + b'x' * (size - 28) + b'"}'
+    return body + b' ' * (size - len(body))
+
+
+def test_run_webhook_rejects_wrong_secret(run_webhook_client):
+    response = run_webhook_client.post(run_webhook.WEBHOOK_PATH, data=UPDATE, headers=_headers('wrong'))
+    assert response.status_code == 403
+
+    response = run_webhook_client.post(run_webhook.WEBHOOK_PATH, data=UPDATE, content_type='application/json')
+    assert response.status_code == 403
+
+
+def test_run_webhook_accepts_update(run_webhook_client):
+    response = run_webhook_client.post(
+        run_webhook.WEBHOOK_PATH, data=UPDATE,
+        headers=_headers(run_webhook.WEBHOOK_SECRET_TOKEN, 'application/json; charset=utf-8')
+    )
+    assert response.status_code == 200
+
+
+def test_run_webhook_rejects_non_json(run_webhook_client):
+    response = run_webhook_client.post(
+        run_webhook.WEBHOOK_PATH, data=b'update_id=1',
+        headers=_headers(run_webhook.WEBHOOK_SECRET_TOKEN, 'application/x-www-form-urlencoded')
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_run_webhook_size_limit(run_webhook_client, chunked):
+    limit = run_webhook.WEBHOOK_MAX_CONTENT_LENGTH
+    headers = _headers(run_webhook.WEBHOOK_SECRET_TOKEN)
+
+    def post(body):
+        if not chunked:
+            return run_webhook_client.post(run_webhook.WEBHOOK_PATH, data=body, headers=headers)
+        # Тело без Content-Length, как при Transfer-Encoding: chunked
+        return run_webhook_client.post(
+            run_webhook.WEBHOOK_PATH, input_stream=io.BytesIO(body),
+            headers=dict(headers, **{'Transfer-Encoding': 'chunked'}),
+            environ_overrides={'wsgi.input_terminated': True}
+        )
+
+    assert post(_body(limit)).status_code == 200
+    assert post(_body(limit + 1)).status_code == 413
+
+
+def test_webhook_server_rejects_wrong_secret(webhook_server_client):
+    response = webhook_server_client.post(webhook_server.WEBHOOK_PATH, data=UPDATE, headers=_headers('wrong'))
+    assert response.status_code == 403
+
+
+def test_webhook_server_rejects_non_json(webhook_server_client):
+    response = webhook_server_client.post(
+        webhook_server.WEBHOOK_PATH, data=b'update_id=1',
+        headers=_headers(webhook_server.WEBHOOK_SECRET_TOKEN, 'text/plain')
+    )
+    assert response.status_code == 415
+
+
+def test_webhook_server_accepts_update(webhook_server_client):
+    response = webhook_server_client.post(
+        webhook_server.WEBHOOK_PATH, data=UPDATE, headers=_headers(webhook_server.WEBHOOK_SECRET_TOKEN)
+    )
+    assert response.status_code == 200
+
+
+def test_webhook_server_rejects_oversized_body(webhook_server_client):
+    limit = webhook_server.app.config['MAX_CONTENT_LENGTH']
+    response = webhook_server_client.post(
+        webhook_server.WEBHOOK_PATH, data=_body(limit + 1), headers=_headers(webhook_server.WEBHOOK_SECRET_TOKEN)
+    )
+    assert response.status_code == 413
@@ -1,182 +1,290 @@
-from flask import Flask, request, jsonify
-import telebot
-import logging
-import os
-import sys
-from datetime import datetime
-from utils.helpers import format_datetime
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-# Импорт модулей проекта
-from config import (
-    TELEGRAM_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_HOST,
-    WEBHOOK_PORT, WEBHOOK_LISTEN, WEBHOOK_SSL_CERT, WEBHOOK_SSL_PRIV
-)
-from bot import bot
-from database.db_manager import DatabaseManager
-from payments.yukassa import YuKassaPayment
-
-# Инициализация Flask-приложения
-app = Flask(__name__)
-
-# Установка вебхука для Telegram
-@app.route('/set_webhook', methods=['GET', 'POST'])
-def set_webhook():
-    """Установка вебхука для Telegram"""
-    bot.remove_webhook()
-    url = f"{WEBHOOK_URL}/bot{TELEGRAM_BOT_TOKEN}"
-    
-    if WEBHOOK_SSL_CERT:
-        bot.set_webhook(url=url, certificate=open(WEBHOOK_SSL_CERT, 'r'))
-    else:
-        bot.set_webhook(url=url)
-    
-    return "Webhook установлен!"
-
-# Обработчик запросов от Telegram
-@app.route(f'/bot{TELEGRAM_BOT_TOKEN}', methods=['POST'])
-def webhook():
-    """Обработчик запросов от Telegram"""
-    if request.headers.get('content-type') == 'application/json':
-        json_string = request.get_data().decode('utf-8')
-        update = telebot.types.Update.de_json(json_string)
-        bot.process_new_updates([update])
-        return ''
-    else:
-        return 'Некорректный запрос'
-
-# Обработчик обратных вызовов от ЮKassa
-@app.route('/payment_notification', methods=['POST'])
-def payment_notification():
-    """Обработчик обратных вызовов от ЮKassa"""
-    try:
-        # Получение данных от ЮKassa
-        data = request.json
-        
-        # Обработка вебхука
-        payment_data = YuKassaPayment.process_webhook(data)
-        
-        if payment_data:
-            # Добавление подписки пользователю
-            user_id = payment_data['user_id']
-            months = payment_data['months']
-            payment_id = payment_data['payment_id']
-            
-            # Добавление подписки
-            subscription = DatabaseManager.add_subscription(user_id, months, payment_id)
-            
-            if subscription:
-                # Отправка уведомления пользователю
-                end_date = format_datetime(subscription.end_date)
-                
-                message_text = (
-                    "✅ *Подписка успешно оформлена!*\n\n"
-                    f"Период: {months} мес.\n"
-                    f"Дата окончания: {end_date}\n\n"
-                    "Теперь вы можете делать неограниченное количество запросов для анализа КБЖУ."
-                )
-                
-                bot.send_message(user_id, message_text, parse_mode="Markdown")
-        
-        return jsonify({"success": True}), 200
-    
-    except Exception as e:
-        logger.error(f"Ошибка при обработке уведомления о платеже: {str(e)}")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# Обработчик колбека после успешной оплаты
-@app.route('/payment_callback', methods=['GET'])
-def payment_callback():
-    """Обработчик колбека после успешной оплаты"""
-    user_id = request.args.get('user_id')
-    
-    if not user_id:
-        return "Ошибка: отсутствует идентификатор пользователя", 400
-    
-    # Страница успешной оплаты
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Оплата успешно выполнена</title>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                text-align: center;
-                margin-top: 50px;
-                background-color: #f5f5f5;
-            }
-            .container {
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: #fff;
-                border-radius: 10px;
-                box-shadow: 0 0 10px rgba(0,0,0,0.1);
-            }
-            h1 {
-                color: #4CAF50;
-            }
-            .btn {
-                display: inline-block;
-                background-color: #4CAF50;
-                color: white;
-                padding: 10px 20px;
-                margin-top: 20px;
-                text-decoration: none;
-                border-radius: 5px;
-            }
-            p {
-                line-height: 1.6;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Оплата успешно выполнена!</h1>
-            <p>Спасибо за оформление подписки на бота для анализа КБЖУ по фотографии еды.</p>
-            <p>Ваша подписка активирована. Вы можете вернуться в Telegram и продолжить использование бота.</p>
-            <a href="https://t.me/YourBotUsername" class="btn">Вернуться в Telegram</a>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return html
-
-# Запуск сервера для обработки вебхуков
-if __name__ == "__main__":
-    # Удаление старого вебхука, если он существует
-    bot.remove_webhook()
-    
-    # Установка нового вебхука
-    url = f"{WEBHOOK_URL}/bot{TELEGRAM_BOT_TOKEN}"
-    if WEBHOOK_SSL_CERT:
-        bot.set_webhook(url=url, certificate=open(WEBHOOK_SSL_CERT, 'r'))
-    else:
-        bot.set_webhook(url=url)
-    
-    # Запуск веб-сервера
-    if WEBHOOK_SSL_CERT and WEBHOOK_SSL_PRIV:
-        # Запуск с SSL
-        app.run(
-            host=WEBHOOK_LISTEN,
-            port=WEBHOOK_PORT,
-            ssl_context=(WEBHOOK_SSL_CERT, WEBHOOK_SSL_PRIV),
-            debug=False
-        )
-    else:
-        # Запуск без SSL
-        app.run(
-            host=WEBHOOK_LISTEN,
-            port=WEBHOOK_PORT,
-            debug=False
-        )
\ No newline at end of file
+# gevent патчит стандартную библиотеку до импорта остальных модулей: сокеты requests/telebot
+# и ожидания становятся кооперативными (под gunicorn -k gevent воркер делает то же самое)
+from gevent import monkey
+monkey.patch_all()
+from gevent.pywsgi import WSGIServer
+
+from flask import Flask, request, abort, Response
+import telebot
+from telebot import apihelper
+import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+import os
+import sys
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+from datetime import datetime
+from utils.helpers import format_datetime
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Импорт модулей проекта
+from config import (
+    TELEGRAM_BOT_TOKEN, WEBHOOK_URL,
+    WEBHOOK_PORT, WEBHOOK_LISTEN, WEBHOOK_SSL_CERT,
+    IS_POSTGRESQL
+)
+
+if IS_POSTGRESQL:
+    # psycopg2 - C-расширение, monkey.patch_all его не затрагивает: без wait-callback
+    # каждый запрос к БД блокировал бы все гринлеты воркера
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+import config
+from bot import bot
+from database.db_manager import DatabaseManager
+from payments.yukassa import YuKassaPayment
+
+# Общий пул соединений для запросов к Telegram API. По умолчанию telebot создает
+# отдельную сессию на каждый поток (под gevent - на каждый гринлет), и TLS-рукопожатие
+# с api.telegram.org повторяется; с общей сессией соединения переиспользуются
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+apihelper.session = _SESSION
+
+# Инициализация Flask-приложения (статика этому серверу не нужна)
+app = Flask(__name__, static_folder=None)
+
+# Путь вебхука вычисляется один раз; запросы подписываются секретом в заголовке
+# X-Telegram-Bot-Api-Secret-Token (если в конфиге его нет - выводится из токена бота)
+WEBHOOK_PATH = f'/bot{TELEGRAM_BOT_TOKEN}'
+WEBHOOK_SECRET_TOKEN = (
+    getattr(config, 'WEBHOOK_SECRET_TOKEN', None)
+    or hashlib.sha256(TELEGRAM_BOT_TOKEN.encode('utf-8')).hexdigest()
+)
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET_TOKEN.encode('utf-8')
+
+# Типы обновлений, для которых у бота есть обработчики; остальные Telegram не присылает
+# (allowed_updates), а если пришли - отбрасываются без построения объектов telebot
+HANDLED_UPDATE_TYPES = ('message', 'callback_query', 'pre_checkout_query')
+
+# Если у nginx самоподписанный сертификат, он передается в Telegram при set_webhook; читается один раз
+_CERT_BYTES = None
+if WEBHOOK_SSL_CERT:
+    with open(WEBHOOK_SSL_CERT, 'rb') as cert_file:
+        _CERT_BYTES = cert_file.read()
+
+# Установка вебхука для Telegram (из командной строки: python webhook_server.py setup)
+def setup_webhook():
+    """Установка вебхука для Telegram"""
+    # Удаление старого вебхука, если он существует
+    bot.remove_webhook()
+    
+    # Установка нового вебхука
+    url = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
+    bot.set_webhook(
+        url=url,
+        certificate=_CERT_BYTES,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        allowed_updates=list(HANDLED_UPDATE_TYPES)
+    )
+    logger.info(f"Webhook установлен: {WEBHOOK_URL}")
+
+# Очередь обновлений Telegram: webhook отвечает сразу, а обновления по порядку
+# обрабатывает один фоновый поток (под gevent - гринлет)
+UPDATE_BATCH_SIZE = 32
+_update_queue = queue.Queue()
+_update_worker_started = threading.Event()
+_update_worker_lock = threading.Lock()
+
+def _process_updates_worker():
+    """Передает обновления из очереди в telebot пачками до UPDATE_BATCH_SIZE штук"""
+    while True:
+        batch = [_update_queue.get()]
+        try:
+            while len(batch) < UPDATE_BATCH_SIZE:
+                batch.append(_update_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        try:
+            bot.process_new_updates(batch)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке обновления: {str(e)}")
+
+def _start_update_worker():
+    """Запускает обработчик очереди (один раз на процесс, при первом обновлении)"""
+    if _update_worker_started.is_set():
+        return
+    with _update_worker_lock:
+        if not _update_worker_started.is_set():
+            threading.Thread(target=_process_updates_worker, name="update-worker", daemon=True).start()
+            _update_worker_started.set()
+
+# Обновления Telegram меньше 1 МБ; запросы к вебхуку не в JSON отклоняются до чтения тела
+app.config['MAX_CONTENT_LENGTH'] = 1 * 1024 * 1024
+
+@app.before_request
+def reject_non_json_updates():
+    """Отклоняет запросы к вебхуку Telegram с Content-Type не application/json"""
+    if request.path == WEBHOOK_PATH and not request.is_json:
+        abort(415)
+
+# Обработчик запросов от Telegram
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def webhook():
+    """Обработчик запросов от Telegram: ставит обновление в очередь и сразу отвечает 200"""
+    # Чужие запросы отсекаются до чтения и разбора тела
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '').encode('utf-8')
+    if not hmac.compare_digest(secret, _WEBHOOK_SECRET_BYTES):
+        abort(403)
+
+    # Content-Type уже проверен в reject_non_json_updates
+    update_dict = orjson.loads(request.get_data())
+    if not any(kind in update_dict for kind in HANDLED_UPDATE_TYPES):
+        return ''
+    update = telebot.types.Update.de_json(update_dict)
+    _start_update_worker()
+    _update_queue.put_nowait(update)
+    return ''
+
+# Текст уведомления об оформленной подписке
+_SUBSCRIPTION_OK_MESSAGE = (
+    "✅ *Подписка успешно оформлена!*\n\n"
+    "Период: {months} мес.\n"
+    "Дата окончания: {end_date}\n\n"
+    "Теперь вы можете делать неограниченное количество запросов для анализа КБЖУ."
+)
+
+# Уведомления пользователям отправляются в фоне: ЮKassa получает ответ сразу после записи в БД
+_notify_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="notify")
+
+def _notify_subscription(user_id, months, end_date):
+    """Формирует и отправляет уведомление об оформленной подписке; ошибки только логируются"""
+    try:
+        message_text = _SUBSCRIPTION_OK_MESSAGE.format(
+            months=months,
+            end_date=format_datetime(end_date)
+        )
+        bot.send_message(user_id, message_text, parse_mode="Markdown")
+    except Exception as e:
+        logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {str(e)}")
+
+# Готовые ответы ЮKassa: тело одинаково для всех уведомлений, JSON-кодирование не нужно
+_PAYMENT_OK_RESPONSE = (b'{"success":true}', 200, {'Content-Type': 'application/json'})
+_PAYMENT_ERROR_RESPONSE = (b'{"success":false}', 500, {'Content-Type': 'application/json'})
+
+# Обработчик обратных вызовов от ЮKassa
+@app.route('/payment_notification', methods=['POST'])
+def payment_notification():
+    """Обработчик обратных вызовов от ЮKassa"""
+    try:
+        # Получение данных от ЮKassa
+        data = orjson.loads(request.get_data())
+        
+        # Обработка вебхука
+        payment_data = YuKassaPayment.process_webhook(data)
+        
+        if payment_data:
+            # Добавление подписки пользователю
+            user_id = payment_data['user_id']
+            months = payment_data['months']
+            payment_id = payment_data['payment_id']
+            
+            # Добавление подписки
+            subscription = DatabaseManager.add_subscription(user_id, months, payment_id)
+            
+            if subscription:
+                # Отправка уведомления пользователю (текст собирается уже в фоне)
+                _notify_executor.submit(_notify_subscription, user_id, months, subscription.end_date)
+        
+        return _PAYMENT_OK_RESPONSE
+    
+    except Exception:
+        # Подробности ошибки остаются в логе, ЮKassa получает только признак неуспеха
+        logger.exception("Ошибка при обработке уведомления о платеже")
+        return _PAYMENT_ERROR_RESPONSE
+
+# Страница успешной оплаты: одинакова для всех пользователей, кодируется один раз при загрузке
+_CALLBACK_HTML = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Оплата успешно выполнена</title>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <style>
+            body {
+                font-family: Arial, sans-serif;
+                text-align: center;
+                margin-top: 50px;
+                background-color: #f5f5f5;
+            }
+            .container {
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+                background-color: #fff;
+                border-radius: 10px;
+                box-shadow: 0 0 10px rgba(0,0,0,0.1);
+            }
+            h1 {
+                color: #4CAF50;
+            }
+            .btn {
+                display: inline-block;
+                background-color: #4CAF50;
+                color: white;
+                padding: 10px 20px;
+                margin-top: 20px;
+                text-decoration: none;
+                border-radius: 5px;
+            }
+            p {
+                line-height: 1.6;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>Оплата успешно выполнена!</h1>
+            <p>Спасибо за оформление подписки на бота для анализа КБЖУ по фотографии еды.</p>
+            <p>Ваша подписка активирована. Вы можете вернуться в Telegram и продолжить использование бота.</p>
+            <a href="https://t.me/YourBotUsername" class="btn">Вернуться в Telegram</a>
+        </div>
+    </body>
+    </html>
+    """.encode('utf-8')
+_CALLBACK_HEADERS = {'Cache-Control': 'public, max-age=3600'}
+
+# Обработчик колбека после успешной оплаты
+@app.route('/payment_callback', methods=['GET'])
+def payment_callback():
+    """Обработчик колбека после успешной оплаты"""
+    user_id = request.args.get('user_id')
+    
+    if not user_id:
+        return "Ошибка: отсутствует идентификатор пользователя", 400
+    
+    return Response(_CALLBACK_HTML, mimetype='text/html', headers=_CALLBACK_HEADERS)
+
+# Запуск сервера для обработки вебхуков.
+# В продакшене: gunicorn -k gevent -w 1 --worker-connections 1000 --keep-alive 5 webhook_server:app
+# (один процесс - next_step-обработчики и user_data бота хранятся в памяти процесса);
+# WSGIServer ниже - запуск без gunicorn.
+# python webhook_server.py setup - только установить вебхук и выйти
+if __name__ == "__main__":
+    setup_webhook()
+    if len(sys.argv) > 1 and sys.argv[1] == 'setup':
+        sys.exit(0)
+    
+    # Запуск веб-сервера: gevent WSGIServer обслуживает запросы гринлетами в одном цикле событий.
+    # TLS завершается на nginx перед приложением, сервер слушает обычный HTTP
+    server = WSGIServer((WEBHOOK_LISTEN, WEBHOOK_PORT), app)
+    server.serve_forever()
\ No newline at end of file